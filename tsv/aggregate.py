@@ -0,0 +1,128 @@
+from __future__ import absolute_import, division
+
+from record import APSummary
+
+# Collapses repeated observations of the same BSSID into one APSummary per
+# group: a signal-weighted centroid, the best (smallest) accuracy, the first
+# and last timestamps and an observation count.
+#
+# Without a window, each BSSID forms a single group for the whole input. With
+# a window (in seconds), a group closes once it spans more than window seconds
+# or has not been seen for window seconds, so only the APs seen recently are
+# kept in memory. Groups of observations without a timestamp are timed by the
+# latest timestamp in the input when they were last seen instead.
+
+# Observations without a signal strength weigh as much as a -100 dBm one.
+_DEFAULT_SIGNAL = -100
+
+
+def _signal_weight(signal):
+    # dBm -> mW, so stronger observations dominate the centroid.
+    return 10 ** ((signal or _DEFAULT_SIGNAL) / 10)
+
+
+class _Group(object):
+    __slots__ = ('bssid', 'first_timestamp', 'last_timestamp', 'weight',
+                 'latitude', 'longitude', 'accuracy', 'altitude', 'altitude_weight',
+                 'altitude_accuracy', 'channel', 'signal', 'ssid', 'count', 'seen')
+
+    def __init__(self, ap):
+        weight = _signal_weight(ap.signal)
+        self.bssid = ap.bssid
+        self.first_timestamp = ap.timestamp
+        self.last_timestamp = ap.timestamp
+        self.weight = weight
+        self.latitude = ap.latitude * weight
+        self.longitude = ap.longitude * weight
+        self.accuracy = ap.accuracy
+        self.altitude = ap.altitude * weight if ap.altitude else 0
+        self.altitude_weight = weight if ap.altitude else 0
+        self.altitude_accuracy = ap.altitude_accuracy
+        self.channel = ap.channel
+        self.signal = ap.signal
+        self.ssid = ap.ssid
+        self.count = 1
+        self.seen = 0  # the input's latest timestamp when last seen, with a window
+
+    def add(self, ap):
+        weight = _signal_weight(ap.signal)
+        self.weight += weight
+        self.latitude += ap.latitude * weight
+        self.longitude += ap.longitude * weight
+        if ap.accuracy and (not self.accuracy or ap.accuracy < self.accuracy):
+            self.accuracy = ap.accuracy
+        if ap.altitude:
+            self.altitude += ap.altitude * weight
+            self.altitude_weight += weight
+        if ap.altitude_accuracy and (not self.altitude_accuracy or ap.altitude_accuracy < self.altitude_accuracy):
+            self.altitude_accuracy = ap.altitude_accuracy
+        if ap.timestamp:
+            if not self.first_timestamp or ap.timestamp < self.first_timestamp:
+                self.first_timestamp = ap.timestamp
+            if ap.timestamp >= self.last_timestamp:
+                self.last_timestamp = ap.timestamp
+                self.channel = ap.channel or self.channel
+                self.ssid = ap.ssid or self.ssid
+        if ap.signal and (not self.signal or ap.signal > self.signal):
+            self.signal = ap.signal
+        self.count += 1
+
+    def summary(self):
+        return APSummary(timestamp=self.last_timestamp,
+                         bssid=self.bssid,
+                         latitude=self.latitude / self.weight,
+                         longitude=self.longitude / self.weight,
+                         accuracy=self.accuracy,
+                         altitude=self.altitude / self.altitude_weight if self.altitude_weight else None,
+                         altitude_accuracy=self.altitude_accuracy,
+                         channel=self.channel,
+                         signal=self.signal,
+                         ssid=self.ssid,
+                         first_timestamp=self.first_timestamp,
+                         count=self.count)
+
+
+def _summaries(groups):
+    groups.sort(key=lambda group: (group.first_timestamp, group.bssid))
+    return [group.summary() for group in groups]
+
+
+def aggregate(aps, window=None):
+    groups = {}
+    if window is None:
+        for ap in aps:
+            group = groups.get(ap.bssid)
+            if group is None:
+                groups[ap.bssid] = _Group(ap)
+            else:
+                group.add(ap)
+        for summary in _summaries(groups.values()):
+            yield summary
+        return
+
+    clock = 0        # latest timestamp seen so far
+    next_sweep = 0   # when to look for idle groups again
+    for ap in aps:
+        if ap.timestamp > clock:
+            clock = ap.timestamp
+        group = groups.get(ap.bssid)
+        if group is None:
+            group = groups[ap.bssid] = _Group(ap)
+        elif ap.timestamp and group.first_timestamp and ap.timestamp - group.first_timestamp > window:
+            yield group.summary()
+            group = groups[ap.bssid] = _Group(ap)
+        else:
+            group.add(ap)
+        group.seen = clock
+
+        if clock >= next_sweep:
+            idle = [group for group in groups.itervalues()
+                    if clock - (group.last_timestamp or group.seen) > window]
+            for group in idle:
+                del groups[group.bssid]
+            for summary in _summaries(idle):
+                yield summary
+            next_sweep = clock + window
+
+    for summary in _summaries(groups.values()):
+        yield summary
@@ -0,0 +1,240 @@
+from __future__ import absolute_import, division
+
+import mmap
+import shutil
+import struct
+import tempfile
+
+import compression
+import wifi
+from record import APRecord
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# .apbin: a fixed-width binary file of AP observations that can be memory
+# mapped and used without parsing.
+#
+#   header   32 bytes: magic, version, record size, record count, heap offset
+#   records  record count x 62 bytes, laid out as RECORD_DTYPE
+#   heap     the distinct SSIDs, referenced by (offset, length) from records
+#
+# All values are little-endian. The BSSID is split into its low 32 and high 16
+# bits. Missing (None) values are stored as 0, which the writers already treat
+# as missing.
+
+MAGIC = 'WIFIAPB\0'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sHHIQQ')  # magic, version, record size, reserved, count, heap offset
+
+_RECORD = struct.Struct('<q5dIHHIbB')
+
+_RECORD_FIELDS = (('timestamp', '<i8'),
+                  ('latitude', '<f8'),
+                  ('longitude', '<f8'),
+                  ('accuracy', '<f8'),
+                  ('altitude', '<f8'),
+                  ('altitude_accuracy', '<f8'),
+                  ('bssid_low', '<u4'),
+                  ('bssid_high', '<u2'),
+                  ('channel', '<u2'),
+                  ('ssid_offset', '<u4'),
+                  ('signal', 'i1'),
+                  ('ssid_length', 'u1'))
+
+RECORD_DTYPE = numpy.dtype(list(_RECORD_FIELDS)) if numpy is not None else None
+
+_FLUSH_SIZE = 1 << 20
+_COPY_SIZE = 1 << 20
+
+
+def sniff(prefix):
+    return prefix.startswith(MAGIC)
+
+
+# Writes APs to a seekable binary stream. The header is rewritten with the
+# record count and heap offset by close(), so the file is only valid once the
+# writer is closed.
+class APBinWriter(object):
+    def __init__(self, stream):
+        self._stream = stream
+        self._buffer = []
+        self._buffered = 0
+        self._heap = []
+        self._heap_size = 0
+        self._ssids = {}  # ssid -> heap offset
+        self.rows_written = 0
+        self._stream.write(_HEADER.pack(MAGIC, VERSION, _RECORD.size, 0, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _ssid_offset(self, ssid):
+        offset = self._ssids.get(ssid)
+        if offset is None:
+            offset = self._heap_size
+            self._heap.append(ssid)
+            self._heap_size += len(ssid)
+            self._ssids[ssid] = offset
+        return offset
+
+    def write(self, ap):
+        ssid = ap.ssid
+        if isinstance(ssid, unicode):
+            ssid = ssid.encode('utf-8')
+        data = _RECORD.pack(ap.timestamp,
+                            ap.latitude,
+                            ap.longitude,
+                            ap.accuracy or 0,
+                            ap.altitude or 0,
+                            ap.altitude_accuracy or 0,
+                            ap.bssid & 0xffffffff,
+                            ap.bssid >> 32,
+                            ap.channel or 0,
+                            self._ssid_offset(ssid),
+                            ap.signal or 0,
+                            len(ssid))
+        self._buffer.append(data)
+        self._buffered += len(data)
+        self.rows_written += 1
+        if self._buffered >= _FLUSH_SIZE:
+            self.flush()
+
+    def write_batch(self, aps):
+        for ap in aps:
+            self.write(ap)
+
+    def flush(self):
+        if self._buffer:
+            self._stream.write(''.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def close(self):
+        self.flush()
+        heap_offset = _HEADER.size + self.rows_written * _RECORD.size
+        self._stream.write(''.join(self._heap))
+        self._stream.seek(0)
+        self._stream.write(_HEADER.pack(MAGIC, VERSION, _RECORD.size, 0, self.rows_written, heap_offset))
+        self._stream.seek(0, 2)
+        self._stream.flush()
+
+
+# A memory-mapped .apbin file. Records are decoded on access, or all at once
+# as a zero-copy NumPy structured array with records().
+class APBinFile(object):
+    def __init__(self, filename):
+        with open(filename, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            raise ValueError('Truncated .apbin file: %s' % filename)
+        (magic, version, record_size, reserved, count, heap_offset) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError('Not an .apbin file: %s' % filename)
+        if version != VERSION or record_size != _RECORD.size:
+            raise ValueError('Unsupported .apbin version %d: %s' % (version, filename))
+        if heap_offset != _HEADER.size + count * record_size or heap_offset > len(self._map):
+            raise ValueError('Truncated .apbin file: %s' % filename)
+        self._count = count
+        self._heap_offset = heap_offset
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('APBinFile index out of range')
+        (timestamp, latitude, longitude, accuracy, altitude, altitude_accuracy,
+         bssid_low, bssid_high, channel, ssid_offset, signal, ssid_length) = \
+            _RECORD.unpack_from(self._map, _HEADER.size + i * _RECORD.size)
+        return APRecord(timestamp=timestamp,
+                        bssid=(bssid_high << 32) | bssid_low,
+                        latitude=latitude,
+                        longitude=longitude,
+                        accuracy=accuracy or None,
+                        altitude=altitude or None,
+                        altitude_accuracy=altitude_accuracy or None,
+                        channel=channel or None,
+                        signal=signal or None,
+                        ssid=self.ssid(ssid_offset, ssid_length))
+
+    def __iter__(self):
+        for i in xrange(self._count):
+            yield self[i]
+
+    def ssid(self, offset, length):
+        start = self._heap_offset + offset
+        return self._map[start:start + length]
+
+    def records(self):
+        # A read-only structured array of RECORD_DTYPE backed by the mapping.
+        # It must not be used after close().
+        if numpy is None:
+            raise ImportError('APBinFile.records() requires numpy')
+        return numpy.frombuffer(self._map, dtype=RECORD_DTYPE, count=self._count,
+                                offset=_HEADER.size)
+
+    def close(self):
+        self._map.close()
+
+
+def bssid_column(records):
+    # int64 BSSIDs of a records() array.
+    return (records['bssid_high'].astype(numpy.int64) << 32) | records['bssid_low']
+
+
+def _copy_to_temp(file):
+    # A temporary copy of file, a filename, '-' for standard input or an open
+    # file, decompressed if it is compressed.
+    temp = tempfile.NamedTemporaryFile(prefix='apbin.')
+    try:
+        if hasattr(file, 'read'):
+            shutil.copyfileobj(file, temp, _COPY_SIZE)
+        else:
+            input = compression.open_input(file)
+            try:
+                shutil.copyfileobj(input, temp, _COPY_SIZE)
+            finally:
+                input.close()
+        temp.flush()
+    except Exception:
+        temp.close()
+        raise
+    return temp
+
+
+def _parse_record(ap):
+    return ap
+
+
+def iter_aps(file, rejects=None, stats=None):
+    # file is a filename, '-' for standard input or an open file, like the
+    # converters take. Records are memory-mapped rather than read, so
+    # anything but an uncompressed file is first copied to a temporary file.
+    # Records need no parsing, but go through wifi.parse_rows() to be
+    # filtered and counted in rejects and stats like other formats' rows.
+    temp = None
+    if hasattr(file, 'read') or file == compression.STDIN or compression.is_compressed(file):
+        temp = _copy_to_temp(file)
+        file = temp.name
+    try:
+        with APBinFile(file) as apbin_file:
+            for ap in wifi.parse_rows(apbin_file, _parse_record, rejects=rejects, stats=stats):
+                yield ap
+    finally:
+        if temp is not None:
+            temp.close()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import argparse
+import ast
+import hashlib
+import json
+import logging
+import os
+import sys
+
+import compression
+import formats
+import wifi
+from writer import TSVWriter
+
+# Incremental batch conversion. Each input file is converted to its own .tsv
+# file in an output directory, and a JSON manifest records, per input:
+#
+#   size, mtime, sha1  the input's content, to notice changed files
+#   format, parser     the format and a hash of the source code of the
+#                      converter and every local module it imports
+#   output             the output file
+#   offset, written    how much of the input has been converted, and the
+#                      output size at that point
+#   complete           whether the conversion finished
+#
+# Inputs whose content and parser are unchanged are skipped. Line-based inputs
+# are converted in --chunk-size ranges and the manifest is saved after each
+# one, so an interrupted run resumes from the last finished range.
+
+MANIFEST_VERSION = 1
+
+_HASH_READ_SIZE = 1 << 20
+_MB = 1 << 20
+
+_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Modules that can change any output, besides the converter and its imports.
+_OUTPUT_MODULES = ('writer',)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Incrementally convert Wi-Fi stumbler files to .tsv files')
+    parser.add_argument('--manifest', required=True, help='JSON manifest of converted files')
+    parser.add_argument('--output-dir', required=True, help='directory for the .tsv files')
+    parser.add_argument('--format', choices=[name for name, module in formats.FORMATS],
+                        help='input format (default: detect each file)')
+    parser.add_argument('--chunk-size', type=int, default=64, metavar='MB',
+                        help='checkpoint line-based files every CHUNK_SIZE MB (default: 64)')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='log progress after each file')
+    parser.add_argument('files', nargs='+', metavar='FILE')
+    return parser.parse_args(argv[1:])
+
+
+def _file_sha1(filename):
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as file:
+        while True:
+            data = file.read(_HASH_READ_SIZE)
+            if not data:
+                break
+            sha1.update(data)
+    return sha1.hexdigest()
+
+
+def _local_imports(filename):
+    # The modules in this directory that the source in filename imports,
+    # anywhere in it (including imports in try blocks or functions).
+    with open(filename, 'rb') as file:
+        tree = ast.parse(file.read(), filename)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+    return set(name for name in names if os.path.isfile(os.path.join(_DIRECTORY, name + '.py')))
+
+
+def _dependencies(names):
+    # names and every module in this directory they import, directly or
+    # indirectly.
+    seen = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in seen:
+            seen.add(name)
+            pending.extend(_local_imports(os.path.join(_DIRECTORY, name + '.py')))
+    return seen
+
+
+_parser_versions = {}
+
+def parser_version(format):
+    # A hash of the source of the format's converter, every local module it
+    # imports, directly or indirectly, and the modules that write the output.
+    try:
+        return _parser_versions[format]
+    except KeyError:
+        pass
+    sha1 = hashlib.sha1()
+    names = (formats.get_format(format).__name__,) + _OUTPUT_MODULES
+    for name in sorted(_dependencies(names)):
+        with open(os.path.join(_DIRECTORY, name + '.py'), 'rb') as file:
+            sha1.update('%s\n%d\n' % (name, os.fstat(file.fileno()).st_size))
+            sha1.update(file.read())
+    version = _parser_versions[format] = sha1.hexdigest()[:16]
+    return version
+
+
+def load_manifest(filename):
+    if not os.path.exists(filename):
+        return {'version': MANIFEST_VERSION, 'files': {}}
+    with open(filename, 'r') as file:
+        manifest = json.load(file)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError('Unsupported manifest version: %s' % filename)
+    return manifest
+
+
+def save_manifest(manifest, filename):
+    # Replace the manifest atomically, so a crash never leaves it half written.
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+        file.flush()
+        os.fsync(file.fileno())
+    os.rename(temp_filename, filename)
+
+
+def _output_filename(manifest, filename, output_dir):
+    # <input name>.tsv, with a -N suffix if another input already uses it.
+    used = set(entry['output'] for entry in manifest['files'].itervalues())
+    base = os.path.join(output_dir, os.path.basename(filename))
+    output = base + '.tsv'
+    n = 2
+    while output in used:
+        output = '%s-%d.tsv' % (base, n)
+        n += 1
+    return output
+
+
+def _current_entry(manifest, filename, format, output_dir):
+    # The manifest entry for filename, reset if the file or its parser changed.
+    stat = os.stat(filename)
+    entry = manifest['files'].get(filename)
+    if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+        sha1 = entry['sha1']
+    else:
+        sha1 = _file_sha1(filename)
+    if format is None:
+        format = formats.detect_format(filename)
+    version = parser_version(format)
+    if (entry is None or entry['sha1'] != sha1 or entry['format'] != format or
+            entry['parser'] != version or not os.path.exists(entry['output'])):
+        output = entry['output'] if entry is not None else _output_filename(manifest, filename, output_dir)
+        entry = {'output': output, 'offset': 0, 'written': 0, 'complete': False}
+    entry.update(size=stat.st_size, mtime=stat.st_mtime, sha1=sha1, format=format, parser=version)
+    manifest['files'][filename] = entry
+    return entry
+
+
+def _open_output(entry):
+    # Opens the output to append after the last checkpoint, dropping anything
+    # written after it.
+    mode = 'r+b' if entry['written'] and os.path.exists(entry['output']) else 'wb'
+    output = open(entry['output'], mode)
+    output.truncate(entry['written'])
+    output.seek(entry['written'])
+    return output
+
+
+def convert_file(manifest, manifest_filename, filename, format, output_dir, chunk_size):
+    # Converts filename, or what is left of it, and returns the number of rows
+    # written by this call.
+    filename = os.path.abspath(filename)
+    entry = _current_entry(manifest, filename, format, output_dir)
+    if entry['complete']:
+        return 0
+    module = formats.get_format(entry['format'])
+    if hasattr(module, 'iter_range_aps') and not compression.is_compressed(filename):
+        # The checkpoint is a line boundary, but need not be a range boundary
+        # if --chunk-size changed.
+        ranges = [(max(start, entry['offset']), end)
+                  for (start, end) in wifi.split_lines(filename, chunk_size)
+                  if end > entry['offset']]
+    else:
+        ranges = [(None, None)]
+
+    rows = 0
+    with _open_output(entry) as output:
+        for (start, end) in ranges:
+            if start is None:
+                aps = module.iter_aps(filename)
+            else:
+                aps = module.iter_range_aps(filename, start, end)
+            with TSVWriter(output, header=entry['written'] == 0) as writer:
+                for ap in aps:
+                    writer.write(ap)
+            os.fsync(output.fileno())
+            rows += writer.rows_written
+            entry['offset'] = end if end is not None else entry['size']
+            entry['written'] = output.tell()
+            save_manifest(manifest, manifest_filename)
+    entry['complete'] = True
+    save_manifest(manifest, manifest_filename)
+    return rows
+
+
+def main(argv):
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    manifest = load_manifest(args.manifest)
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    failures = 0
+    for i, filename in enumerate(args.files, 1):
+        try:
+            rows = convert_file(manifest, args.manifest, filename, args.format,
+                                args.output_dir, args.chunk_size * _MB)
+        except Exception:
+            failures += 1
+            logging.exception('[%d/%d] %s failed', i, len(args.files), filename)
+            continue
+        logging.info('[%d/%d] %s: %d rows', i, len(args.files), filename, rows)
+    save_manifest(manifest, args.manifest)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
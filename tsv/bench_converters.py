@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import peak_rss
+import synth
+
+# Throughput and memory benchmark of every converter on synthetic inputs made
+# by synth.py. Each format is converted to .tsv in a child process by
+# peak_rss.py, so peak RSS is the converter's alone. Reports input rows per
+# second, input MB per second and peak RSS per format.
+#
+# --save-baseline FILE stores the results as JSON; --baseline FILE compares
+# the results with a stored run and exits with status 1 if a format's rows/s
+# or MB/s fell, or its peak RSS grew, by more than --tolerance.
+#
+#   ./tsv/bench_converters.py --rows 200000 --save-baseline baseline.json
+#   ./tsv/bench_converters.py --rows 200000 --baseline baseline.json
+#
+# A full-size OpenWLANMap dump, with a different BSSID in every row:
+#
+#   ./tsv/bench_converters.py --format openwlanmap --rows 20000000 --bssids 20000000
+
+_MB = 1 << 20
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the converters on synthetic inputs')
+    parser.add_argument('--rows', type=int, default=200000,
+                        help='records per synthetic input (default: 200000)')
+    parser.add_argument('--bssids', type=int,
+                        help='distinct BSSIDs per synthetic input (default: a quarter of --rows)')
+    parser.add_argument('--format', action='append', choices=sorted(synth.FIXTURES),
+                        help='benchmark only this format (may be repeated)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='convert each input N times and keep the fastest run (default: 1)')
+    parser.add_argument('--baseline', metavar='FILE', help='compare with the results in FILE')
+    parser.add_argument('--save-baseline', metavar='FILE', help='write the results to FILE')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed fraction of slowdown or memory growth (default: 0.1)')
+    return parser.parse_args(argv[1:])
+
+
+def _run(format, filename, rows, size):
+    (rows_out, seconds, peak_rss_mb) = peak_rss.measure(format, filename)
+    return {
+        'rows': rows,
+        'rows_out': rows_out,
+        'mb': round(size / _MB, 3),
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds),
+        'mb_per_second': round(size / _MB / seconds, 3),
+        'peak_rss_mb': round(peak_rss_mb, 1),
+    }
+
+
+def _regressions(result, baseline, tolerance):
+    # Descriptions of the ways result is worse than baseline.
+    regressions = []
+    for key in ('rows_per_second', 'mb_per_second'):
+        if result[key] < baseline[key] * (1 - tolerance):
+            regressions.append('%s %.4g < %.4g' % (key, result[key], baseline[key]))
+    if result['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + tolerance):
+        regressions.append('peak_rss_mb %.1f > %.1f' % (result['peak_rss_mb'], baseline['peak_rss_mb']))
+    return regressions
+
+
+def main(argv):
+    args = _parse_args(argv)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)['formats']
+
+    results = {}
+    failures = 0
+    temp_dir = tempfile.mkdtemp(prefix='bench_converters.')
+    try:
+        print "%-28s %10s %8s %8s %10s %8s %12s  %s" % (
+            "format", "rows", "MB", "seconds", "rows/s", "MB/s", "peak RSS MB", "vs. baseline")
+        for format in args.format or sorted(synth.FIXTURES):
+            filename = os.path.join(temp_dir, format)
+            with open(filename, 'wb') as file:
+                size = synth.write_synthetic(format, args.rows, file, args.bssids)
+            runs = [_run(format, filename, args.rows, size) for i in xrange(max(1, args.repeat))]
+            result = results[format] = min(runs, key=lambda run: run['seconds'])
+            os.remove(filename)
+
+            comparison = ''
+            if format in baseline:
+                regressions = _regressions(result, baseline[format], args.tolerance)
+                if baseline[format]['rows'] != result['rows']:
+                    comparison = '(baseline has %d rows) ' % baseline[format]['rows']
+                if regressions:
+                    failures += 1
+                    comparison += 'REGRESSION: ' + ', '.join(regressions)
+                else:
+                    comparison += '%+.1f%% rows/s' % (100 * (result['rows_per_second'] /
+                                                            baseline[format]['rows_per_second'] - 1))
+            print "%-28s %10d %8.1f %8.2f %10d %8.2f %12.1f  %s" % (
+                format, result['rows'], result['mb'], result['seconds'], result['rows_per_second'],
+                result['mb_per_second'], result['peak_rss_mb'], comparison)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump({'python': sys.version.split()[0], 'formats': results}, file, indent=1, sort_keys=True)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
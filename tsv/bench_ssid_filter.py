@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import random
+import sys
+import timeit
+
+import wifi
+from ssid_filter import SSIDFilter
+
+# Micro-benchmark of the compiled SSID filter against the linear scan it
+# replaced in wifi._is_mobile_ssid.
+#
+#   ./tsv/bench_ssid_filter.py [ssid_count] [distinct_ssid_count]
+
+
+def _linear_is_mobile_ssid(ssid):
+    for prefix in wifi._SSID_PREFIX_LIST:
+        if ssid.startswith(prefix):
+            return True
+    for suffix in wifi._SSID_SUFFIX_LIST:
+        if ssid.endswith(suffix):
+            return True
+    for substring in wifi._SSID_SUBSTRING_LIST:
+        if ssid.find(substring) != -1:
+            return True
+    return False
+
+
+_WORDS = ["Home", "Network", "linksys", "NETGEAR", "2WIRE", "belkin", "Guest",
+          "Free Public WiFi", "dlink", "xfinitywifi", "Cafe", "Office", "5G"]
+
+
+def _random_ssid(rnd):
+    patterns = wifi._SSID_PREFIX_LIST + wifi._SSID_SUFFIX_LIST + wifi._SSID_SUBSTRING_LIST
+    words = [rnd.choice(_WORDS) for i in xrange(rnd.randint(0, 3))]
+    if rnd.random() < 0.1:
+        words.insert(rnd.randint(0, len(words)), rnd.choice(patterns))
+    return " ".join(words)[:32]
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 200000
+    distinct = int(argv[2]) if len(argv) > 2 else 5000
+
+    rnd = random.Random(0)
+    vocabulary = [_random_ssid(rnd) for i in xrange(distinct)]
+    ssids = [rnd.choice(vocabulary) for i in xrange(count)]
+
+    ssid_filter = SSIDFilter(wifi._SSID_PREFIX_LIST, wifi._SSID_SUFFIX_LIST, wifi._SSID_SUBSTRING_LIST)
+    for ssid in vocabulary:
+        assert ssid_filter(ssid) == _linear_is_mobile_ssid(ssid), ssid
+
+    def run(is_mobile_ssid):
+        return min(timeit.repeat(lambda: [is_mobile_ssid(ssid) for ssid in ssids], number=1, repeat=3))
+
+    linear = run(_linear_is_mobile_ssid)
+    compiled = run(ssid_filter._match)
+    memoized = run(SSIDFilter(wifi._SSID_PREFIX_LIST, wifi._SSID_SUFFIX_LIST, wifi._SSID_SUBSTRING_LIST))
+
+    print "%d SSIDs (%d distinct)" % (count, distinct)
+    for name, seconds in [("linear", linear), ("compiled", compiled), ("memoized", memoized)]:
+        print "%-10s %8.3f s %12.0f SSIDs/s %6.1fx" % (name, seconds, count / seconds, linear / seconds)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
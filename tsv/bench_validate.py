@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import sys
+import time
+
+import numpy
+
+import validate
+import wifi
+
+# Checks validate.validate_columns() against wifi.AP row for row and compares
+# their throughput.
+#
+#   ./tsv/bench_validate.py [rows] [scalar_sample_rows]
+
+_SSIDS = ["Home", "linksys", "2WIRE493", "", "Steve's iPhone", "AndroidAP", "x" * 33,
+          "Free Public WiFi", "Guest", "dogtown", "My Network_nomap"]
+
+_REASON_CODES = dict((name, code) for (code, name) in enumerate(validate.REASONS))
+
+
+def _random_columns(rows, seed=0):
+    rnd = numpy.random.RandomState(seed)
+
+    def sometimes(values, zero=0.1):
+        return numpy.where(rnd.random_sample(rows) < zero, 0, values)
+
+    now = time.time()
+    return dict(
+        timestamp=rnd.randint(900000000, int(now) + 86400, rows).astype(numpy.int64),
+        bssid=sometimes(rnd.randint(0, 1 << 48, rows, dtype=numpy.int64), 0.01),
+        latitude=sometimes(rnd.uniform(-91, 91, rows), 0.02),
+        longitude=sometimes(rnd.uniform(-181, 181, rows), 0.02),
+        accuracy=sometimes(rnd.uniform(0, 21000, rows)),
+        altitude=sometimes(rnd.uniform(-500, 9000, rows)),
+        altitude_accuracy=sometimes(rnd.uniform(0, 21000, rows)),
+        channel=sometimes(rnd.randint(0, 20000, rows).astype(numpy.int32)),
+        signal=sometimes(rnd.randint(-130, 5, rows).astype(numpy.int32)),
+        ssid=rnd.randint(0, len(_SSIDS), rows).astype(numpy.int32))
+
+
+def _validate(columns, now):
+    ssid_length = numpy.array([len(ssid) for ssid in _SSIDS])[columns['ssid']]
+    mobile_ssid = numpy.array([wifi._is_mobile_ssid(ssid) for ssid in _SSIDS])[columns['ssid']]
+    return validate.validate_columns(columns['timestamp'], columns['bssid'],
+                                     columns['latitude'], columns['longitude'],
+                                     columns['accuracy'], columns['altitude'],
+                                     columns['altitude_accuracy'], columns['channel'],
+                                     columns['signal'], ssid_length, mobile_ssid, now)
+
+
+def _scalar_reason(columns, i):
+    # Returns wifi.AP's reason code (None for a row wifi.drop_reason() filters
+    # out) and its APRecord.
+    def optional(name):
+        return columns[name][i].item() or None
+    bssid = columns['bssid'][i].item()
+    try:
+        ap = wifi.AP(timestamp=columns['timestamp'][i].item(),
+                     bssid=bssid,
+                     latitude=columns['latitude'][i].item(),
+                     longitude=columns['longitude'][i].item(),
+                     accuracy=optional('accuracy'),
+                     altitude=optional('altitude'),
+                     altitude_accuracy=optional('altitude_accuracy'),
+                     channel=optional('channel'),
+                     signal=optional('signal'),
+                     ssid=_SSIDS[columns['ssid'][i]])
+    except ValueError as e:
+        return (_REASON_CODES[str(e).split(':')[0]], None)
+    return (validate.OK if wifi.drop_reason(ap) is None else None, ap)
+
+
+def main(argv):
+    rows = int(argv[1]) if len(argv) > 1 else 1000000
+    sample = int(argv[2]) if len(argv) > 2 else 100000
+    now = time.time()
+
+    columns = _random_columns(rows)
+
+    start = time.time()
+    (timestamp, keep, reason) = _validate(columns, now)
+    vector_seconds = time.time() - start
+
+    start = time.time()
+    for i in xrange(min(sample, rows)):
+        (expected, ap) = _scalar_reason(columns, i)
+        if expected is None:
+            assert not keep[i] and reason[i] >= validate.NULL_ISLAND, i
+        else:
+            assert reason[i] == expected, (i, reason[i], expected)
+        if ap is not None:
+            assert timestamp[i] == ap.timestamp, i
+    scalar_seconds = time.time() - start
+
+    scalar_rate = min(sample, rows) / scalar_seconds
+    vector_rate = rows / vector_seconds
+    print "%d rows, %d kept" % (rows, keep.sum())
+    for code, name in enumerate(validate.REASONS):
+        print "  %-18s %10d" % (name, (reason == code).sum())
+    print "scalar wifi.AP  %12.0f rows/s" % scalar_rate
+    print "vectorized      %12.0f rows/s %6.1fx" % (vector_rate, vector_rate / scalar_rate)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import argparse
+import os
+import sys
+import tempfile
+
+import peak_rss
+import synth
+
+# Regression check for the streaming XML converters: peak RSS should stay
+# flat as the input grows. Each XML format is converted from synthetic inputs
+# of each --size made by synth.py, and the check fails (exit status 1) if a
+# format's peak RSS on the largest input is more than --max-growth above its
+# peak RSS on the smallest. The inputs share a fixed pool of BSSIDs, so the
+# BSSID cache doesn't grow with them. Inputs are written to $TMPDIR, which
+# needs room for the largest one.
+#
+#   ./tsv/bench_xml_memory.py --size 10 --size 1000 --size 4000
+
+_FORMATS = ('kismet_gpsxml', 'wififofum_kml', 'wigle_kml')
+_BSSIDS = 1000
+
+# Records written to estimate a format's record size.
+_SAMPLE_RECORDS = 10000
+
+_MB = 1 << 20
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Check that the XML converters run in constant memory')
+    parser.add_argument('--size', type=int, action='append', metavar='MB',
+                        help='input size to convert (may be repeated; default: 10, 100 and 1000)')
+    parser.add_argument('--format', action='append', choices=_FORMATS,
+                        help='check only this format (may be repeated)')
+    parser.add_argument('--max-growth', type=float, default=0.2,
+                        help='allowed fraction of peak RSS growth from the smallest input '
+                             'to the largest (default: 0.2)')
+    return parser.parse_args(argv[1:])
+
+
+def _records_per_mb(format):
+    with open(os.devnull, 'wb') as file:
+        size = synth.write_synthetic(format, _SAMPLE_RECORDS, file, _BSSIDS)
+    return _SAMPLE_RECORDS * _MB / size
+
+
+def main(argv):
+    args = _parse_args(argv)
+    sizes = sorted(args.size or [10, 100, 1000])
+    failures = 0
+    print "%-14s %10s %8s %10s %8s %12s  %s" % (
+        "format", "records", "MB", "rows", "seconds", "peak RSS MB", "growth")
+    for format in args.format or _FORMATS:
+        records_per_mb = _records_per_mb(format)
+        smallest = None
+        for size in sizes:
+            count = int(size * records_per_mb)
+            with tempfile.NamedTemporaryFile(suffix='.' + format) as file:
+                written = synth.write_synthetic(format, count, file, _BSSIDS)
+                file.flush()
+                (rows, seconds, peak_rss_mb) = peak_rss.measure(format, file.name)
+            if smallest is None:
+                smallest = peak_rss_mb
+            growth = peak_rss_mb / smallest - 1
+            comparison = '%+.1f%%' % (100 * growth)
+            if growth > args.max_growth:
+                failures += 1
+                comparison += ' REGRESSION'
+            print "%-14s %10d %8.1f %10d %8.2f %12.1f  %s" % (
+                format, count, written / _MB, rows, seconds, peak_rss_mb, comparison)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
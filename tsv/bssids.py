@@ -0,0 +1,59 @@
+from __future__ import absolute_import, division
+
+import re
+
+# BSSIDs are handled internally as 48-bit ints: parsed once when a row is read
+# and formatted back to "01:23:45:67:89:ab" only when a row is written. Both
+# directions are memoized because the same APs show up thousands of times in a
+# trace.
+
+MAX_BSSID = (1 << 48) - 1
+
+_SEPARATED_RE = re.compile(r'([0-9A-Fa-f]{1,2})([:-])' +
+                           r'([0-9A-Fa-f]{1,2})\2' * 4 +
+                           r'([0-9A-Fa-f]{1,2})\Z')
+_BARE_RE = re.compile(r'[0-9A-Fa-f]{12}\Z')
+
+_MAX_CACHED_BSSIDS = 1 << 18
+_parse_cache = {}
+_format_cache = {}
+
+
+def _parse(mac):
+    m = _SEPARATED_RE.match(mac)
+    if m is not None:
+        (b0, sep, b1, b2, b3, b4, b5) = m.groups()
+        return ((int(b0, 16) << 40) | (int(b1, 16) << 32) | (int(b2, 16) << 24) |
+                (int(b3, 16) << 16) | (int(b4, 16) << 8) | int(b5, 16))
+    if _BARE_RE.match(mac):
+        return int(mac, 16)
+    raise ValueError("Bad BSSID: %s" % mac)
+
+
+def parse(mac):
+    # "01:23:45:67:89:ab", "1-23-45-67-89-AB" or "0123456789ab" -> int
+    try:
+        return _parse_cache[mac]
+    except KeyError:
+        pass
+    n = _parse(mac)
+    if len(_parse_cache) >= _MAX_CACHED_BSSIDS:
+        _parse_cache.clear()
+    _parse_cache[mac] = n
+    return n
+
+
+def format(n):
+    # int -> "01:23:45:67:89:ab"
+    try:
+        return _format_cache[n]
+    except KeyError:
+        pass
+    if not 0 <= n <= MAX_BSSID:
+        raise ValueError("Bad BSSID: %r" % n)
+    h = '%012x' % n
+    mac = ':'.join((h[0:2], h[2:4], h[4:6], h[6:8], h[8:10], h[10:12]))
+    if len(_format_cache) >= _MAX_CACHED_BSSIDS:
+        _format_cache.clear()
+    _format_cache[n] = mac
+    return mac
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import synth
+
+# Checks that stumbler_tsv.py writes the same output, and exits with the same
+# status, with and without -j, for a run of three synthetic files where the
+# middle one has a bad line halfway through. With -j, the bad file is split
+# into --chunk-size 1 MB ranges, so only one of its ranges fails; the whole
+# file must still be skipped, as it is in a serial run. Runs are checked with
+# and without --tolerant and --sort. Exits with status 1 if any differ.
+#
+#   ./tsv/check_parallel.py --rows 100000 -j 4
+
+_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stumbler_tsv.py')
+
+# A line no converter can parse, so it fails the file, or is rejected with
+# --tolerant.
+_BAD_LINE = 'this is not a gmon line\n'
+
+_OPTIONS = ([], ['--tolerant'], ['--sort'])
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Check that stumbler_tsv.py -j matches a serial run')
+    parser.add_argument('--rows', type=int, default=100000,
+                        help='rows per synthetic file (default: 100000)')
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='workers for the parallel run (default: 4)')
+    return parser.parse_args(argv[1:])
+
+
+def _write_inputs(directory, rows):
+    filenames = []
+    for (i, bad) in enumerate((False, True, False)):
+        filename = os.path.join(directory, 'input%d.txt' % i)
+        with open(filename, 'wb') as file:
+            synth.write_synthetic('gmon', rows, file, seed=i)
+        if bad:
+            with open(filename, 'rb') as file:
+                lines = file.readlines()
+            lines.insert(len(lines) // 2, _BAD_LINE)
+            with open(filename, 'wb') as file:
+                file.writelines(lines)
+        filenames.append(filename)
+    return filenames
+
+
+def _run(directory, name, options, filenames):
+    # Returns (exit status, output).
+    output = os.path.join(directory, name + '.tsv')
+    with open(os.devnull, 'w') as devnull:
+        status = subprocess.call([sys.executable, _SCRIPT, '-o', output] + options + filenames,
+                                 stderr=devnull)
+    with open(output, 'rb') as file:
+        return (status, file.read())
+
+
+def main(argv):
+    args = _parse_args(argv)
+    directory = tempfile.mkdtemp(prefix='check_parallel.')
+    failures = 0
+    try:
+        filenames = _write_inputs(directory, args.rows)
+        for options in _OPTIONS:
+            serial = _run(directory, 'serial', options, filenames)
+            parallel = _run(directory, 'parallel',
+                            options + ['-j', str(args.jobs), '--chunk-size', '1'], filenames)
+            label = ' '.join(options) or '(default)'
+            if serial == parallel:
+                print "%-12s ok: exit status %d, %d rows" % (label, serial[0], serial[1].count('\n') - 1)
+            else:
+                failures += 1
+                print "%-12s DIFFERENT: exit status %d and %d, %d and %d rows" % (
+                    label, serial[0], parallel[0],
+                    serial[1].count('\n') - 1, parallel[1].count('\n') - 1)
+    finally:
+        shutil.rmtree(directory)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,194 @@
+from __future__ import absolute_import, division
+
+import bz2
+import collections
+import io
+import sys
+import zipfile
+import zlib
+from multiprocessing.pool import ThreadPool
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+# Streaming decompression of gzip, bzip2, xz and zip input, detected by magic
+# bytes rather than file name, and parallel gzip compression of output.
+
+_MAGICS = (('\x1f\x8b', 'gzip'),
+           ('BZh', 'bzip2'),
+           ('\xfd7zXZ\x00', 'xz'),
+           ('PK\x03\x04', 'zip'))
+_MAGIC_SIZE = max(len(magic) for (magic, name) in _MAGICS)
+
+_READ_SIZE = 1 << 20
+
+STDIN = '-'
+
+
+def _gzip_decompressor():
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def _xz_decompressor():
+    if lzma is None:
+        raise ValueError('xz input requires the lzma module (backports.lzma on Python 2)')
+    return lzma.LZMADecompressor()
+
+
+_DECOMPRESSORS = {
+    'gzip': _gzip_decompressor,
+    'bzip2': bz2.BZ2Decompressor,
+    'xz': _xz_decompressor,
+}
+
+
+def compression_of(prefix):
+    # 'gzip', 'bzip2', 'xz', 'zip' or None for the first bytes of a file.
+    for magic, name in _MAGICS:
+        if prefix.startswith(magic):
+            return name
+    return None
+
+
+def is_compressed(filename):
+    if filename == STDIN:
+        return False
+    with open(filename, 'rb') as file:
+        return compression_of(file.read(_MAGIC_SIZE)) is not None
+
+
+# Decompresses a stream of concatenated compressed members, as written by
+# pigz, pbzip2 or ParallelGzipWriter. Wrap it in an io.BufferedReader for
+# read(), readline() and line iteration.
+class _DecompressingReader(io.RawIOBase):
+    def __init__(self, file, new_decompressor):
+        self._file = file
+        self._new_decompressor = new_decompressor
+        self._decompressor = new_decompressor()
+        self._pending = ''
+
+    def readable(self):
+        return True
+
+    def _decompress(self, data):
+        chunks = []
+        while data:
+            try:
+                chunks.append(self._decompressor.decompress(data))
+            except EOFError:
+                # bz2 and lzma refuse data after the end of a member.
+                self._decompressor = self._new_decompressor()
+                continue
+            data = self._decompressor.unused_data
+            if data:
+                self._decompressor = self._new_decompressor()
+        return ''.join(chunks)
+
+    def readinto(self, buffer):
+        while not self._pending:
+            data = self._file.read(_READ_SIZE)
+            if not data:
+                return 0
+            self._pending = self._decompress(data)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self):
+        self._file.close()
+        io.RawIOBase.close(self)
+
+
+def open_input(filename):
+    # Opens filename ('-' for standard input) for reading, decompressing it if
+    # it is compressed. A zip archive is read from its first member.
+    if filename == STDIN:
+        file = io.open(sys.stdin.fileno(), 'rb', buffering=_READ_SIZE, closefd=False)
+    else:
+        file = io.open(filename, 'rb', buffering=_READ_SIZE)
+    compression = compression_of(file.peek(_MAGIC_SIZE)[:_MAGIC_SIZE])
+    if compression is None:
+        return file
+    try:
+        if compression == 'zip':
+            archive = zipfile.ZipFile(file)
+            names = [info.filename for info in archive.infolist() if not info.filename.endswith('/')]
+            if not names:
+                raise ValueError('Empty zip archive: %s' % filename)
+            return archive.open(names[0])
+        return io.BufferedReader(_DecompressingReader(file, _DECOMPRESSORS[compression]), _READ_SIZE)
+    except Exception:
+        file.close()
+        raise
+
+
+def _gzip_member(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+# Compresses everything written to it into stream as a gzip file made of
+# independently compressed block_size members. Blocks are compressed by a pool
+# of threads (zlib releases the GIL), so compression overlaps with parsing
+# and uses several cores.
+class ParallelGzipWriter(object):
+    def __init__(self, stream, jobs=1, block_size=1 << 20, level=6):
+        self._stream = stream
+        self._jobs = max(1, jobs)
+        self._block_size = block_size
+        self._level = level
+        self._pool = ThreadPool(self._jobs)
+        self._pending = collections.deque()  # compressed members in write order
+        self._buffer = []
+        self._buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _submit(self):
+        data = ''.join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        self._pending.append(self._pool.apply_async(_gzip_member, (data, self._level)))
+        # Keep a few blocks in flight per thread without holding the whole
+        # output in memory.
+        while len(self._pending) > 2 * self._jobs:
+            self._stream.write(self._pending.popleft().get())
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self._block_size:
+            self._submit()
+
+    def flush(self):
+        # Writes the members that are already compressed. A partial block is
+        # only compressed by close(), so frequent flushes don't shrink members.
+        while self._pending and self._pending[0].ready():
+            self._stream.write(self._pending.popleft().get())
+        self._stream.flush()
+
+    def close(self):
+        if self._pool is None:
+            return
+        try:
+            if self._buffered:
+                self._submit()
+            while self._pending:
+                self._stream.write(self._pending.popleft().get())
+            self._stream.flush()
+        finally:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
@@ -0,0 +1,80 @@
+from __future__ import absolute_import, division
+
+import re
+
+# Declarative column specs for the delimited line formats (gmon, iPhone CSV,
+# Kismet CSV, NS1, OpenWLANMap, WiGLE CSV and WiGLE ~-separated).
+#
+# A Schema is a delimiter, an optional quote character and a list of Columns.
+# Each column has a regex for its text, whose groups are the column's values,
+# and optionally a type and sentinel values to convert them with. At most one
+# column is a VariableColumn: free text like an SSID, which may contain the
+# delimiter.
+#
+# Schema.regex is the whole-line regex the columns describe, and
+# Schema.parse() matches a line with it and converts the values.
+
+
+class Column(object):
+    def __init__(self, pattern, type=None, sentinels=None):
+        # type converts the value of a column with one group. Values found in
+        # the sentinels dict (like '?' or '<no ssid>') are replaced by their
+        # dict value instead.
+        self.pattern = pattern
+        self.groups = re.compile(pattern).groups
+        self.type = type
+        self.sentinels = sentinels
+        if (type is not None or sentinels is not None) and self.groups != 1:
+            raise ValueError('Only columns with one group can be typed: %s' % pattern)
+
+
+class VariableColumn(Column):
+    # prefix, then min_length to max_length (None: any number of) characters,
+    # then suffix. The characters are the column's value.
+    def __init__(self, min_length=0, max_length=None, prefix='', suffix='', type=None, sentinels=None):
+        lengths = '{%d,%s}' % (min_length, max_length if max_length is not None else '')
+        Column.__init__(self, re.escape(prefix) + '(.' + lengths + ')' + re.escape(suffix),
+                        type, sentinels)
+
+
+class Schema(object):
+    def __init__(self, delimiter, columns, quote=''):
+        # quote: every column is quoted with it, like "a","b"
+        variables = [column for column in columns if isinstance(column, VariableColumn)]
+        if len(variables) > 1:
+            raise ValueError('A schema can only have one variable column')
+        self.delimiter = delimiter
+        self.columns = columns
+        separator = re.escape(quote + delimiter + quote)
+        quote = re.escape(quote)
+        self.regex = re.compile(quote + separator.join(column.pattern for column in columns) + quote)
+        self.groups = self.regex.groups
+        self._regex_match = self.regex.match
+
+        # (group index, type, sentinels) for each value to convert
+        self._conversions = []
+        group = 0
+        for column in columns:
+            if column.type is not None or column.sentinels is not None:
+                self._conversions.append((group, column.type, column.sentinels))
+            group += column.groups
+
+    def match(self, line):
+        # The groups of Schema.regex.match(line), or None if it doesn't match.
+        m = self._regex_match(line)
+        return m.groups() if m is not None else None
+
+    def parse(self, line):
+        # The groups of line converted by their columns' types, or None if it
+        # doesn't match.
+        m = self._regex_match(line)
+        if m is None:
+            return None
+        values = list(m.groups())
+        for (i, type, sentinels) in self._conversions:
+            value = values[i]
+            if sentinels is not None and value in sentinels:
+                values[i] = sentinels[value]
+            elif type is not None:
+                values[i] = type(value)
+        return values
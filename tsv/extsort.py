@@ -0,0 +1,180 @@
+from __future__ import absolute_import, division
+
+import heapq
+import operator
+import os
+import struct
+import tempfile
+
+from record import APRecord, APSummary
+
+# External merge sort of AP records by (BSSID, timestamp) for inputs larger
+# than memory. Records are sorted in memory-budget-sized runs, each run is
+# written to a temporary file in a compact binary encoding, and the runs are
+# merged with a k-way heap merge. At most fan_in runs are merged at once; with
+# more, groups of them are first merged into longer runs, in as many passes as
+# it takes.
+#
+# write_runs() and merge_runs() are the two halves of sort_aps(), for callers
+# that sort several inputs, possibly in other processes, into one output.
+
+# bssid, timestamp, latitude, longitude, accuracy, altitude, altitude_accuracy,
+# channel, signal, first timestamp, count, SSID length; followed by the SSID
+# bytes. Missing (None) values are stored as 0, which the writers already
+# treat as missing. APRecords have a count of 0, APSummarys at least 1.
+_RECORD = struct.Struct('<Qq5diiqIB')
+
+# Rough in-memory cost of one APRecord and its fields, used to turn a memory
+# budget into a run length.
+_RECORD_MEMORY = 400
+
+# Runs merged at once. Each open run costs a file descriptor and a read
+# buffer.
+_FAN_IN = 64
+
+_sort_key = operator.itemgetter(1, 0)  # (bssid, timestamp)
+
+
+def _encode(ap):
+    if isinstance(ap, APSummary):
+        (first_timestamp, count) = (ap.first_timestamp, ap.count)
+    else:
+        (first_timestamp, count) = (0, 0)
+    ssid = ap.ssid
+    if isinstance(ssid, unicode):
+        ssid = ssid.encode('utf-8')
+    return _RECORD.pack(ap.bssid,
+                        ap.timestamp,
+                        ap.latitude,
+                        ap.longitude,
+                        ap.accuracy or 0,
+                        ap.altitude or 0,
+                        ap.altitude_accuracy or 0,
+                        ap.channel or 0,
+                        ap.signal or 0,
+                        first_timestamp,
+                        count,
+                        len(ssid)) + ssid
+
+
+def _decode_run(filename):
+    with open(filename, 'rb') as file:
+        read = file.read
+        size = _RECORD.size
+        unpack = _RECORD.unpack
+        while True:
+            data = read(size)
+            if not data:
+                return
+            (bssid, timestamp, latitude, longitude, accuracy, altitude, altitude_accuracy,
+             channel, signal, first_timestamp, count, ssid_length) = unpack(data)
+            ap = APRecord(timestamp=timestamp,
+                          bssid=bssid,
+                          latitude=latitude,
+                          longitude=longitude,
+                          accuracy=accuracy or None,
+                          altitude=altitude or None,
+                          altitude_accuracy=altitude_accuracy or None,
+                          channel=channel or None,
+                          signal=signal or None,
+                          ssid=read(ssid_length))
+            if count:
+                ap = APSummary(*(ap + (first_timestamp, count)))
+            yield ap
+
+
+def _write_run(aps, tempdir):
+    # Writes aps, in order, to a new temporary file and returns its name.
+    (fd, filename) = tempfile.mkstemp(suffix='.run', dir=tempdir)
+    with os.fdopen(fd, 'wb') as file:
+        batch = []
+        for ap in aps:
+            batch.append(_encode(ap))
+            if len(batch) >= 4096:
+                file.write(''.join(batch))
+                batch = []
+        file.write(''.join(batch))
+    return filename
+
+
+def _remove(filenames):
+    for filename in filenames:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+def _keyed(run, index):
+    # (key, run index) breaks ties between runs in input order, so the merge
+    # is stable and never compares the records themselves.
+    for ap in run:
+        yield ((ap.bssid, ap.timestamp), index, ap)
+
+
+def _merge(runs):
+    for (key, index, ap) in heapq.merge(*[_keyed(run, i) for (i, run) in enumerate(runs)]):
+        yield ap
+
+
+def _unique(aps):
+    # Keep the first of each run of records with the same (bssid, timestamp).
+    last = None
+    for ap in aps:
+        key = (ap.bssid, ap.timestamp)
+        if key != last:
+            last = key
+            yield ap
+
+
+def write_runs(aps, memory=256 << 20, tempdir=None):
+    # Sorts aps into runs of about memory bytes each, writes them to
+    # temporary files and returns their names, in input order. The caller
+    # owns the files: merge_runs() removes them.
+    run_length = max(1, memory // _RECORD_MEMORY)
+    filenames = []
+    run = []
+    try:
+        for ap in aps:
+            run.append(ap)
+            if len(run) >= run_length:
+                run.sort(key=_sort_key)
+                filenames.append(_write_run(run, tempdir))
+                run = []
+        if run:
+            run.sort(key=_sort_key)
+            filenames.append(_write_run(run, tempdir))
+    except:
+        _remove(filenames)
+        raise
+    return filenames
+
+
+def merge_runs(filenames, unique=False, tempdir=None, fan_in=_FAN_IN):
+    # Yields the records of the runs in filenames merged in order, stable for
+    # equal keys in the order of filenames, and removes the files. With
+    # unique, only the first record for each (bssid, timestamp) is kept.
+    filenames = list(filenames)
+    try:
+        while len(filenames) > fan_in:
+            # Merging consecutive runs keeps the merge stable.
+            merged = []
+            for i in xrange(0, len(filenames), fan_in):
+                group = filenames[i:i + fan_in]
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                merged.append(_write_run(_merge([_decode_run(f) for f in group]), tempdir))
+                _remove(group)
+            filenames = merged
+        aps = _merge([_decode_run(filename) for filename in filenames])
+        if unique:
+            aps = _unique(aps)
+        for ap in aps:
+            yield ap
+    finally:
+        _remove(filenames)
+
+
+def sort_aps(aps, memory=256 << 20, unique=False, tempdir=None, fan_in=_FAN_IN):
+    # Yields aps sorted by (bssid, timestamp), stable for equal keys. With
+    # unique, only the first record for each (bssid, timestamp) is kept.
+    return merge_runs(write_runs(aps, memory, tempdir), unique, tempdir, fan_in)
@@ -0,0 +1,63 @@
+from __future__ import absolute_import, division
+
+import apbin
+import compression
+import tsv_gmon
+import tsv_iphone_consolidated_db
+import tsv_iphone_consolidated_sqlite
+import tsv_kismet_csv
+import tsv_kismet_gpsxml
+import tsv_ns1
+import tsv_openwlanmap
+import tsv_reader
+import tsv_wififofum_kml
+import tsv_wigle_csv
+import tsv_wigle_kml
+import tsv_wigle_tildesv
+import wifi
+
+# Converter modules by format name, in the order their sniff() functions are
+# tried. Every module has iter_aps(file, rejects=None, stats=None) and
+# sniff(prefix).
+FORMATS = [
+    ('kismet_gpsxml', tsv_kismet_gpsxml),
+    ('wigle_kml', tsv_wigle_kml),
+    ('wififofum_kml', tsv_wififofum_kml),
+    ('wigle_csv', tsv_wigle_csv),
+    ('gmon', tsv_gmon),
+    ('ns1', tsv_ns1),
+    ('kismet_csv', tsv_kismet_csv),
+    ('openwlanmap', tsv_openwlanmap),
+    ('wigle_tildesv', tsv_wigle_tildesv),
+    ('iphone_consolidated_db', tsv_iphone_consolidated_db),
+    ('iphone_consolidated_sqlite', tsv_iphone_consolidated_sqlite),
+    ('tsv', tsv_reader),
+    ('apbin', apbin),
+]
+
+SNIFF_SIZE = 8192
+
+
+def get_format(name):
+    for format_name, module in FORMATS:
+        if format_name == name:
+            return module
+    raise ValueError('Unknown format: %s' % name)
+
+
+def sniff_format(prefix):
+    for name, module in FORMATS:
+        if module.sniff(prefix):
+            return name
+    return None
+
+
+def detect_format(filename):
+    if filename == compression.STDIN:
+        raise ValueError('Use --format to read standard input')
+    with wifi.open_input(filename) as file:
+        prefix = file.read(SNIFF_SIZE)
+    name = sniff_format(prefix)
+    if name is None:
+        raise ValueError('Unknown file format: %s' % filename)
+    return name
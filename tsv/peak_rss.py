@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import itertools
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import formats
+from writer import TSVWriter
+
+# Converts a file to .tsv (written to /dev/null) in a child process, so the
+# peak RSS measured is the converter's alone, not the benchmark's. Used by
+# bench_converters.py and bench_xml_memory.py. Run as a script, it is the
+# child: it prints the rows written, the seconds taken and its peak RSS in KB.
+#
+#   ./tsv/peak_rss.py FORMAT FILE
+
+_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'peak_rss.py')
+
+_BATCH_SIZE = 4096
+
+
+def _convert(format, filename):
+    start = time.time()
+    aps = formats.get_format(format).iter_aps(filename)
+    with open(os.devnull, 'wb') as output:
+        with TSVWriter(output) as writer:
+            while True:
+                batch = list(itertools.islice(aps, _BATCH_SIZE))
+                if not batch:
+                    break
+                writer.write_batch(batch)
+    seconds = time.time() - start
+    maxrss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print "%d %f %d" % (writer.rows_written, seconds, maxrss_kb)
+
+
+def measure(format, filename):
+    # Returns (rows written, seconds, peak RSS in MB) of converting filename.
+    output = subprocess.check_output([sys.executable, _SCRIPT, format, filename])
+    (rows, seconds, maxrss_kb) = output.split()
+    return (int(rows), float(seconds), int(maxrss_kb) / 1024)
+
+
+def main(argv):
+    _convert(argv[1], argv[2])
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import argparse
+import sys
+
+import tiles
+from writer import TSVWriter
+
+# Prints the rows of a tiled .tsv file (see stumbler_tsv.py --tile-size) that
+# lie within a bounding box, reading only the tiles that cover it.
+#
+#   ./tsv/query_tiles.py --bbox 47.5 -122.5 47.8 -122.2 seattle.tsv
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Query a tiled .tsv file by bounding box')
+    parser.add_argument('--bbox', type=float, nargs=4, required=True,
+                        metavar=('SOUTH', 'WEST', 'NORTH', 'EAST'),
+                        help='bounding box in degrees; WEST > EAST crosses the antimeridian')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    parser.add_argument('file', metavar='FILE')
+    return parser.parse_args(argv[1:])
+
+
+def main(argv):
+    args = _parse_args(argv)
+    (south, west, north, east) = args.bbox
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        with TSVWriter(output) as writer:
+            for row in tiles.iter_bbox_rows(args.file, south, west, north, east):
+                writer.write_formatted(row, 1)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,5 +1,14 @@
 from __future__ import absolute_import, division
 
+from array import array
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
 # literal: http://stackoverflow.com/questions/3335268/are-object-literals-pythonic
 # Record: https://github.com/pthatcher/pyrec/blob/master/Record.py
 class Record(object):
@@ -13,3 +22,128 @@ class Record(object):
         raise AttributeError('%s.__setattr__(%s)' % (self, name))
     def __delattr__(self, name):
         raise AttributeError('%s.__delattr__(%s)' % (self, name))
+
+
+AP_FIELDS = ('timestamp',
+             'bssid',
+             'latitude',
+             'longitude',
+             'accuracy',
+             'altitude',
+             'altitude_accuracy',
+             'channel',
+             'signal',
+             'ssid')
+
+# An immutable, fixed-schema AP observation. Being a tuple, it has no
+# per-instance __dict__, so it is several times smaller and cheaper to build
+# than a Record with the same fields.
+class APRecord(namedtuple('APRecord', AP_FIELDS)):
+    __slots__ = ()
+
+
+# Several observations of one AP collapsed by aggregate.aggregate(). timestamp
+# is the last time the AP was seen, so an APSummary can be written anywhere an
+# APRecord can.
+class APSummary(namedtuple('APSummary', AP_FIELDS + ('first_timestamp', 'count'))):
+    __slots__ = ()
+
+
+def _int64_typecode():
+    for typecode in ('l', 'q'):
+        try:
+            if array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    raise ValueError('No 64-bit array typecode')
+
+_INT64 = _int64_typecode()
+
+
+# Columnar storage for many APRecords. Each field lives in its own typed array
+# and SSIDs are interned, so a batch costs about 70 bytes per observation
+# instead of a Python object per field. Missing (None) values are stored as 0,
+# which wifi.AP and wifi.print_ap already treat as missing.
+class APBatch(object):
+    _COLUMNS = (('timestamp', _INT64),
+                ('bssid', _INT64),
+                ('latitude', 'd'),
+                ('longitude', 'd'),
+                ('accuracy', 'd'),
+                ('altitude', 'd'),
+                ('altitude_accuracy', 'd'),
+                ('channel', 'i'),
+                ('signal', 'i'),
+                ('ssid', 'i'))     # index into self.ssids
+
+    def __init__(self, aps=()):
+        self.clear()
+        self.extend(aps)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def _intern_ssid(self, ssid):
+        index = self._ssid_index.get(ssid)
+        if index is None:
+            index = len(self.ssids)
+            self.ssids.append(ssid)
+            self._ssid_index[ssid] = index
+        return index
+
+    def append(self, ap):
+        self.timestamp.append(ap.timestamp)
+        self.bssid.append(ap.bssid)
+        self.latitude.append(ap.latitude)
+        self.longitude.append(ap.longitude)
+        self.accuracy.append(ap.accuracy or 0)
+        self.altitude.append(ap.altitude or 0)
+        self.altitude_accuracy.append(ap.altitude_accuracy or 0)
+        self.channel.append(ap.channel or 0)
+        self.signal.append(ap.signal or 0)
+        self.ssid.append(self._intern_ssid(ap.ssid))
+
+    def extend(self, aps):
+        for ap in aps:
+            self.append(ap)
+
+    def clear(self):
+        for name, typecode in self._COLUMNS:
+            setattr(self, name, array(typecode))
+        self.ssids = []
+        self._ssid_index = {}
+
+    def __getitem__(self, i):
+        return APRecord(timestamp=self.timestamp[i],
+                        bssid=self.bssid[i],
+                        latitude=self.latitude[i],
+                        longitude=self.longitude[i],
+                        accuracy=self.accuracy[i] or None,
+                        altitude=self.altitude[i] or None,
+                        altitude_accuracy=self.altitude_accuracy[i] or None,
+                        channel=self.channel[i] or None,
+                        signal=self.signal[i] or None,
+                        ssid=self.ssids[self.ssid[i]])
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def columns(self):
+        # Zero-copy NumPy views of the columns, keyed by field name.
+        if numpy is None:
+            raise ImportError('APBatch.columns() requires numpy')
+        return dict((name, numpy.frombuffer(getattr(self, name), dtype=getattr(self, name).typecode))
+                    for name, typecode in self._COLUMNS)
+
+
+def iter_batches(aps, size=65536):
+    batch = APBatch()
+    for ap in aps:
+        batch.append(ap)
+        if len(batch) >= size:
+            yield batch
+            batch = APBatch()
+    if len(batch):
+        yield batch
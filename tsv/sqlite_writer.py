@@ -0,0 +1,182 @@
+from __future__ import absolute_import, division
+
+import sqlite3
+
+# Writes APs to a SQLite database for ad-hoc queries. Rows are inserted with
+# executemany() in large transactions, with the database in WAL mode, and the
+# indexes are dropped for the load and built once it is done, which is far
+# faster than keeping them up to date row by row. A database can be written
+# to again: new rows are appended. If writing fails, the rows since the last
+# commit are rolled back.
+#
+#   aps     one row per AP, like a .tsv row. BSSIDs are 48-bit integers;
+#           missing values are NULL.
+#   bssids  with summary=True, one row per BSSID: the number of rows, the
+#           first and last timestamps, the mean position, the bounding box
+#           of its positions and its last SSID. It is upserted per batch, so
+#           it stays correct across runs.
+#
+# The upsert needs SQLite 3.24 or later.
+
+_CREATE_APS = '''CREATE TABLE IF NOT EXISTS aps (
+    bssid INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    accuracy REAL,
+    altitude REAL,
+    altitude_accuracy REAL,
+    channel INTEGER,
+    signal INTEGER,
+    ssid TEXT NOT NULL)'''
+
+_CREATE_BSSIDS = '''CREATE TABLE IF NOT EXISTS bssids (
+    bssid INTEGER PRIMARY KEY,
+    observations INTEGER NOT NULL,
+    first_seen INTEGER,
+    last_seen INTEGER,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    min_latitude REAL NOT NULL,
+    max_latitude REAL NOT NULL,
+    min_longitude REAL NOT NULL,
+    max_longitude REAL NOT NULL,
+    ssid TEXT NOT NULL)'''
+
+_INSERT_AP = 'INSERT INTO aps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+
+# In an UPDATE, every column on the right refers to the row's old values.
+# Timestamps of 0 (unknown) are NULL, and min() and max() of NULL are NULL.
+_UPSERT_BSSID = '''INSERT INTO bssids VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (bssid) DO UPDATE SET
+    observations = observations + excluded.observations,
+    first_seen = coalesce(min(first_seen, excluded.first_seen), first_seen, excluded.first_seen),
+    last_seen = coalesce(max(last_seen, excluded.last_seen), last_seen, excluded.last_seen),
+    latitude = (latitude * observations + excluded.latitude * excluded.observations) /
+               (observations + excluded.observations),
+    longitude = (longitude * observations + excluded.longitude * excluded.observations) /
+                (observations + excluded.observations),
+    min_latitude = min(min_latitude, excluded.min_latitude),
+    max_latitude = max(max_latitude, excluded.max_latitude),
+    min_longitude = min(min_longitude, excluded.min_longitude),
+    max_longitude = max(max_longitude, excluded.max_longitude),
+    ssid = excluded.ssid'''
+
+# name: columns
+INDEXES = (('aps_bssid', 'bssid, timestamp'),
+           ('aps_timestamp', 'timestamp'),
+           ('aps_position', 'latitude, longitude'))
+
+_TRANSACTION_ROWS = 1000000
+_CACHE_KIB = 256 * 1024
+
+
+def _ap_row(ap):
+    return (ap.bssid,
+            ap.timestamp,
+            ap.latitude,
+            ap.longitude,
+            ap.accuracy or None,
+            ap.altitude or None,
+            ap.altitude_accuracy or None,
+            ap.channel or None,
+            ap.signal or None,
+            ap.ssid)
+
+
+def _summary_rows(rows):
+    # One bssids row per BSSID in rows (from _ap_row()).
+    summaries = {}
+    for (bssid, timestamp, latitude, longitude, a, b, c, d, e, ssid) in rows:
+        timestamp = timestamp or None
+        s = summaries.get(bssid)
+        if s is None:
+            summaries[bssid] = [bssid, 1, timestamp, timestamp, latitude, longitude,
+                                latitude, latitude, longitude, longitude, ssid]
+            continue
+        s[1] += 1
+        if timestamp is not None:
+            if s[2] is None or timestamp < s[2]:
+                s[2] = timestamp
+            if s[3] is None or timestamp > s[3]:
+                s[3] = timestamp
+        s[4] += latitude
+        s[5] += longitude
+        s[6] = min(s[6], latitude)
+        s[7] = max(s[7], latitude)
+        s[8] = min(s[8], longitude)
+        s[9] = max(s[9], longitude)
+        s[10] = ssid
+    for s in summaries.itervalues():
+        s[4] /= s[1]  # sums to means
+        s[5] /= s[1]
+    return summaries.values()
+
+
+class SQLiteWriter(object):
+    def __init__(self, filename, summary=False, transaction_rows=_TRANSACTION_ROWS):
+        if summary and sqlite3.sqlite_version_info < (3, 24):
+            raise ValueError('The BSSID summary needs SQLite 3.24 or later, not %s' % sqlite3.sqlite_version)
+        self._summary = summary
+        self._transaction_rows = transaction_rows
+        self._uncommitted = 0
+        self.rows_written = 0
+        # Transactions are begun and committed explicitly.
+        self._connection = sqlite3.connect(filename, isolation_level=None)
+        # SSIDs are byte strings, and need not be UTF-8.
+        self._connection.text_factory = str
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA synchronous = NORMAL')
+        self._connection.execute('PRAGMA cache_size = -%d' % _CACHE_KIB)
+        self._connection.execute(_CREATE_APS)
+        if summary:
+            self._connection.execute(_CREATE_BSSIDS)
+        for (name, columns) in INDEXES:
+            self._connection.execute('DROP INDEX IF EXISTS %s' % name)
+        self._connection.execute('BEGIN')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, ap):
+        self.write_batch([ap])
+
+    def write_batch(self, aps):
+        rows = [_ap_row(ap) for ap in aps]
+        self._connection.executemany(_INSERT_AP, rows)
+        if self._summary:
+            self._connection.executemany(_UPSERT_BSSID, _summary_rows(rows))
+        self.rows_written += len(rows)
+        self._uncommitted += len(rows)
+        if self._uncommitted >= self._transaction_rows:
+            self._connection.execute('COMMIT')
+            self._connection.execute('BEGIN')
+            self._uncommitted = 0
+
+    def close(self):
+        if self._connection is None:
+            return
+        self._connection.execute('COMMIT')
+        self._connection.execute('BEGIN')
+        for (name, columns) in INDEXES:
+            self._connection.execute('CREATE INDEX IF NOT EXISTS %s ON aps (%s)' % (name, columns))
+        self._connection.execute('COMMIT')
+        self._connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self._connection.close()
+        self._connection = None
+
+    def abort(self):
+        # Rolls back the rows written since the last commit and closes the
+        # database without building the indexes for what is only part of a
+        # load. The next SQLiteWriter on it builds them when it is closed.
+        if self._connection is None:
+            return
+        self._connection.execute('ROLLBACK')
+        self._connection.close()
+        self._connection = None
@@ -0,0 +1,139 @@
+from __future__ import absolute_import, division
+
+# Compiled SSID matcher. Prefixes and suffixes are matched with tries (the
+# suffix trie is built over reversed patterns) and substrings with an
+# Aho-Corasick automaton, so each SSID is scanned at most once per rule kind
+# no matter how many patterns there are. Results are memoized because the same
+# SSIDs show up over and over again in a trace.
+#
+# Rules files have one rule per line, "prefix:", "suffix:" or "substring:"
+# followed by the pattern. Everything after the colon is part of the pattern,
+# including leading and trailing spaces. Blank lines and lines beginning with
+# '#' are ignored.
+#
+# prefix:iPhone
+# suffix:_nomap
+# substring:MiFi
+
+_END = None  # trie key marking the end of a pattern
+
+
+def _build_trie(patterns):
+    root = {}
+    for pattern in patterns:
+        if not pattern:
+            raise ValueError("Empty SSID pattern")
+        node = root
+        for c in pattern:
+            node = node.setdefault(c, {})
+        node[_END] = True
+    return root
+
+
+def _trie_match(trie, chars):
+    node = trie
+    for c in chars:
+        node = node.get(c)
+        if node is None:
+            return False
+        if _END in node:
+            return True
+    return False
+
+
+class _AhoCorasick(object):
+    def __init__(self, patterns):
+        # State 0 is the root. _goto[state] maps a character to the next state.
+        goto = [{}]
+        out = [False]
+        for pattern in patterns:
+            if not pattern:
+                raise ValueError("Empty SSID pattern")
+            state = 0
+            for c in pattern:
+                next_state = goto[state].get(c)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][c] = next_state
+                    goto.append({})
+                    out.append(False)
+                state = next_state
+            out[state] = True
+
+        # Breadth-first walk to compute failure links.
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        i = 0
+        while i < len(queue):
+            state = queue[i]
+            i += 1
+            for c, next_state in goto[state].items():
+                queue.append(next_state)
+                f = fail[state]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(c, 0)
+                fail[next_state] = f if f != next_state else 0
+                out[next_state] = out[next_state] or out[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def search(self, text):
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        state = 0
+        for c in text:
+            while True:
+                next_state = goto[state].get(c)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+            if out[state]:
+                return True
+        return False
+
+
+class SSIDFilter(object):
+    def __init__(self, prefixes=(), suffixes=(), substrings=(), cache_size=1 << 16):
+        self._prefixes = _build_trie(prefixes)
+        self._suffixes = _build_trie([s[::-1] for s in suffixes])
+        self._substrings = _AhoCorasick(substrings)
+        self._cache = {}
+        self._cache_size = cache_size
+
+    @classmethod
+    def from_rules_file(cls, filename, cache_size=1 << 16):
+        rules = {'prefix': [], 'suffix': [], 'substring': []}
+        with open(filename, 'r') as file:
+            for lineno, line in enumerate(file, 1):
+                line = line.rstrip('\r\n')
+                if not line or line[0] == '#':
+                    continue
+                kind, sep, pattern = line.partition(':')
+                if not sep or kind not in rules or not pattern:
+                    raise ValueError("%s:%d: Bad SSID rule: %s" % (filename, lineno, line))
+                rules[kind].append(pattern)
+        return cls(rules['prefix'], rules['suffix'], rules['substring'], cache_size)
+
+    def _match(self, ssid):
+        return (_trie_match(self._prefixes, ssid) or
+                _trie_match(self._suffixes, reversed(ssid)) or
+                self._substrings.search(ssid))
+
+    def __call__(self, ssid):
+        cache = self._cache
+        try:
+            return cache[ssid]
+        except KeyError:
+            pass
+        matched = self._match(ssid)
+        if len(cache) >= self._cache_size:
+            cache.clear()
+        cache[ssid] = matched
+        return matched
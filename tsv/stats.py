@@ -0,0 +1,74 @@
+from __future__ import absolute_import, division
+
+import logging
+import time
+
+# Counters and per-stage timers for a conversion. A Stats is passed to the
+# converters' iter_aps() and on to wifi.parse_lines(), which counts rows and
+# times the read, parse and filter stages on a sample of them.
+#
+# Stages (seconds, summed over all workers):
+#
+#   read      reading lines, or parsing XML up to the next element
+#   parse     regex matching and field conversion in the converters, and
+#             wifi.AP's range checks
+#   filter    wifi.drop_reason()'s null island, null BSSID and mobile SSID
+#             filters
+#   format    formatting rows as .tsv text
+#   write     writing the output
+#
+# Counters: rows_in (lines or XML elements read), rows_parsed (observations
+# the converters returned) and one per drop reason.
+
+STAGES = ('read', 'parse', 'filter', 'format', 'write')
+
+# Rows dropped by wifi.drop_reason(), and rows a converter skipped itself
+# (comments, missing coordinates, cell towers).
+DROP_REASONS = ('null_island', 'null_bssid', 'mobile_ssid', 'skipped')
+
+clock = time.time
+
+
+class Stats(object):
+    def __init__(self, label=None, progress_interval=None):
+        # With a progress_interval (seconds), progress() logs the rows read so
+        # far at most that often.
+        self.label = label
+        self.counts = {}
+        self.seconds = dict((stage, 0.0) for stage in STAGES)
+        self._progress_interval = progress_interval
+        self._started = clock()
+        self._last_progress = self._started
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def merge(self, other):
+        for name, n in other.counts.iteritems():
+            self.count(name, n)
+        for stage, seconds in other.seconds.iteritems():
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def progress(self):
+        if self._progress_interval is None:
+            return
+        now = clock()
+        if now - self._last_progress >= self._progress_interval:
+            self._last_progress = now
+            rows = self.counts.get('rows_in', 0)
+            logging.info('%s: %d rows, %.0f rows/s', self.label, rows, rows / (now - self._started))
+
+    def report(self, elapsed=None):
+        # A JSON-serializable summary.
+        rows_in = self.counts.get('rows_in', 0)
+        report = {
+            'rows_in': rows_in,
+            'rows_parsed': self.counts.get('rows_parsed', 0),
+            'rows_out': self.counts.get('rows_out', 0),
+            'dropped': dict((reason, self.counts.get(reason, 0)) for reason in DROP_REASONS),
+            'seconds': dict((stage, round(seconds, 3)) for (stage, seconds) in self.seconds.iteritems()),
+        }
+        if elapsed is not None:
+            report['elapsed_seconds'] = round(elapsed, 3)
+            report['rows_per_second'] = round(rows_in / elapsed) if elapsed else 0
+        return report
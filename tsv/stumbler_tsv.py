@@ -0,0 +1,421 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import argparse
+import cPickle
+import functools
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+
+import aggregate
+import apbin
+import compression
+import extsort
+import formats
+import sqlite_writer
+import stats
+import tiles
+import wifi
+from writer import TSVWriter, format_ap, format_aps, format_summary
+
+_BATCH_SIZE = 10000  # APs per formatted chunk
+_SPILL_ROWS = 100000  # rows a _Spill keeps in memory
+_MB = 1 << 20
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Convert Wi-Fi stumbler files to .tsv')
+    parser.add_argument('--format', choices=[name for name, module in formats.FORMATS],
+                        help='input format (default: detect each file)')
+    parser.add_argument('-o', '--output',
+                        help='output file, gzip-compressed if it ends in .gz (default: stdout)')
+    parser.add_argument('--output-format', choices=['tsv', 'apbin', 'sqlite'], default='tsv',
+                        help='write .tsv text, .apbin binary records or a SQLite database (default: tsv)')
+    parser.add_argument('--bssid-summary', action='store_true',
+                        help='with --output-format sqlite, also keep a table of one row per BSSID')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='convert up to JOBS files in parallel (default: 1)')
+    parser.add_argument('--chunk-size', type=int, default=64, metavar='MB',
+                        help='with -j, split line-based files into CHUNK_SIZE MB ranges '
+                             'that are parsed in parallel (default: 64)')
+    parser.add_argument('--aggregate', action='store_true',
+                        help='collapse repeated observations of each BSSID in a file into one row, '
+                             'written with its first timestamp and observation count')
+    parser.add_argument('--window', type=int, metavar='SECONDS',
+                        help='with --aggregate, start a new row for a BSSID after SECONDS')
+    parser.add_argument('--sort', action='store_true',
+                        help='sort the output by BSSID and timestamp')
+    parser.add_argument('--sort-memory', type=int, default=256, metavar='MB',
+                        help='with --sort, spill sorted runs to temporary files '
+                             'past about SORT_MEMORY MB (default: 256)')
+    parser.add_argument('--unique', action='store_true',
+                        help='with --sort, keep one row per BSSID and timestamp')
+    parser.add_argument('--tile-size', type=float, metavar='DEGREES',
+                        help='group the rows of the output file into DEGREES x DEGREES tiles '
+                             'and write an index of them to OUTPUT.tiles.json for query_tiles.py')
+    parser.add_argument('--tolerant', action='store_true',
+                        help='skip rows that fail to parse instead of failing the file')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, metavar='FRACTION',
+                        help='with --tolerant, fail a file, and stop the run, once more than '
+                             'FRACTION of its rows are rejected (default: 0.01)')
+    parser.add_argument('--quarantine', metavar='FILE',
+                        help='with --tolerant, write rejected rows to FILE')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='write row counts, drop reasons and time per stage to FILE as JSON')
+    parser.add_argument('--progress', type=float, metavar='SECONDS',
+                        help='log rows read and rows/s every SECONDS while converting')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='log progress after each file')
+    parser.add_argument('files', nargs='+', metavar='FILE',
+                        help="input file, optionally gzip, bzip2, xz or zip compressed; "
+                             "'-' for standard input (requires --format)")
+    args = parser.parse_args(argv[1:])
+    if args.quarantine and not args.tolerant:
+        parser.error('--quarantine requires --tolerant')
+    args.compress = bool(args.output) and args.output.endswith('.gz')
+    if args.compress and (args.tile_size is not None or args.output_format != 'tsv'):
+        parser.error('.gz output requires --output-format tsv without --tile-size')
+    if args.tile_size is not None and not args.output:
+        parser.error('--tile-size requires --output')
+    if args.output_format != 'tsv' and not args.output:
+        parser.error('--output-format %s requires --output' % args.output_format)
+    if args.output_format != 'tsv' and args.tile_size is not None:
+        parser.error('--tile-size requires --output-format tsv')
+    if args.bssid_summary and args.output_format != 'sqlite':
+        parser.error('--bssid-summary requires --output-format sqlite')
+    if args.window is not None and not args.aggregate:
+        parser.error('--window requires --aggregate')
+    if args.aggregate and (args.tile_size is not None or args.output_format != 'tsv'):
+        # Only the summary .tsv format has columns for the first timestamp
+        # and the observation count.
+        parser.error('--aggregate requires --output-format tsv without --tile-size')
+    return args
+
+
+def iter_aps(filename, format=None, rejects=None, stats=None):
+    if format is None:
+        format = formats.detect_format(filename)
+    return formats.get_format(format).iter_aps(filename, rejects=rejects, stats=stats)
+
+
+def _file_tasks(filename, format, chunk_size):
+    # Split uncompressed line-based files into byte ranges that workers can
+    # parse independently. Anything else is converted by a single worker.
+    try:
+        if format is None:
+            format = formats.detect_format(filename)
+        if (hasattr(formats.get_format(format), 'iter_range_aps') and
+                filename != compression.STDIN and not compression.is_compressed(filename)):
+            return [(filename, format, start, end)
+                    for (start, end) in wifi.split_lines(filename, chunk_size)]
+    except (EnvironmentError, ValueError):
+        pass  # _convert() will report the error
+    return [(filename, format, None, None)]
+
+
+class _Spill(object):
+    # The (chunk, rows) pairs of one task. The first _SPILL_ROWS rows are kept
+    # in memory and the rest are pickled to a temporary file, so a task's
+    # output doesn't have to fit in memory. Once closed, a _Spill can be
+    # returned from a worker: only its in-memory chunks and file name are
+    # pickled. Whoever reads it must discard() it. The file is made in
+    # directory, which main() removes with any files left behind.
+    def __init__(self, directory=None):
+        self._directory = directory
+        self.rows = 0
+        self._chunks = []
+        self._filename = None
+        self._file = None
+
+    def append(self, chunk, rows):
+        self.rows += rows
+        if self._file is not None:
+            cPickle.dump((chunk, rows), self._file, cPickle.HIGHEST_PROTOCOL)
+            return
+        self._chunks.append((chunk, rows))
+        if self.rows >= _SPILL_ROWS:
+            (fd, self._filename) = tempfile.mkstemp(suffix='.spill', dir=self._directory)
+            self._file = os.fdopen(fd, 'wb')
+            for item in self._chunks:
+                cPickle.dump(item, self._file, cPickle.HIGHEST_PROTOCOL)
+            self._chunks = []
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __iter__(self):
+        if self._filename is None:
+            for item in self._chunks:
+                yield item
+            return
+        with open(self._filename, 'rb') as file:
+            while True:
+                try:
+                    yield cPickle.load(file)
+                except EOFError:
+                    return
+
+    def discard(self):
+        self.close()
+        self._chunks = []
+        if self._filename is not None:
+            os.remove(self._filename)
+            self._filename = None
+
+
+class _Runs(object):
+    # The sorted runs of one task, from extsort.write_runs().
+    def __init__(self, filenames, rows):
+        self.filenames = filenames
+        self.rows = rows
+
+    def take(self):
+        # Hands the runs over to the caller, who must remove them.
+        (filenames, self.filenames) = (self.filenames, [])
+        return filenames
+
+    def discard(self):
+        for filename in self.take():
+            os.remove(filename)
+
+
+def _count(aps, rows):
+    # Yields aps, counting them in rows[0].
+    for ap in aps:
+        rows[0] += 1
+        yield ap
+
+
+def _convert(task, spill_dir=None, aggregated=False, window=None, formatted=True,
+             sort_memory=None, max_error_rate=None, collect_stats=False, progress_interval=None):
+    # Runs in a worker process, or in this one without -j. Converts a whole
+    # file or one range of a file into a _Spill of its formatted rows (or
+    # lists of APs, if not formatted), so memory use doesn't grow with the
+    # input and a bad file never leaves partial output behind. With a
+    # sort_memory, the APs are instead sorted straight into a _Runs of
+    # extsort runs of about that many bytes. With a max_error_rate, rows
+    # that fail to parse are skipped and returned in a wifi.Rejects. With
+    # collect_stats, counters and stage times are returned in a stats.Stats.
+    (filename, format, start, end) = task
+    spill = _Spill(spill_dir)
+    rejects = wifi.Rejects(max_error_rate) if max_error_rate is not None else None
+    task_stats = None
+    if collect_stats:
+        label = filename if start is None else '%s[%d:%d]' % (filename, start, end)
+        task_stats = stats.Stats(label, progress_interval)
+    try:
+        if start is None:
+            aps = iter_aps(filename, format, rejects, task_stats)
+        else:
+            aps = formats.get_format(format).iter_range_aps(filename, start, end,
+                                                            rejects=rejects, stats=task_stats)
+        if aggregated:
+            aps = aggregate.aggregate(aps, window)
+        if sort_memory is not None:
+            rows = [0]
+            filenames = extsort.write_runs(_count(aps, rows), sort_memory, spill_dir)
+            return (_Runs(filenames, rows[0]), None, rejects, task_stats)
+        while True:
+            batch = list(itertools.islice(aps, _BATCH_SIZE))
+            if not batch:
+                break
+            if formatted:
+                format_start = stats.clock()
+                chunk = format_aps(batch, format_summary if aggregated else format_ap)
+                if task_stats is not None:
+                    task_stats.seconds['format'] += stats.clock() - format_start
+                spill.append(chunk, len(batch))
+            else:
+                spill.append(batch, len(batch))
+        spill.close()
+    except Exception:
+        spill.discard()
+        return (None, traceback.format_exc(), rejects, task_stats)
+    return (spill, None, rejects, task_stats)
+
+
+def _sorted_chunks(outputs, unique, tempdir):
+    # Merges the _Runs of every task.
+    filenames = []
+    for runs in outputs:
+        filenames.extend(runs.take())
+    aps = extsort.merge_runs(filenames, unique, tempdir)
+    while True:
+        batch = list(itertools.islice(aps, _BATCH_SIZE))
+        if not batch:
+            return
+        yield (batch, len(batch))
+
+
+def _write_quarantine(file, filename, first_line, rejects):
+    # One line per rejected row: file, line number (element number for XML
+    # formats), reason, error and the row itself.
+    for (number, reason, error, raw) in rejects.entries:
+        error = ' '.join(error.split())
+        file.write('%s\t%d\t%s\t%s\t%s\n' % (filename, first_line + number, reason, error, raw))
+
+
+def main(argv):
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose or args.progress else logging.WARNING)
+    started = stats.clock()
+
+    spill_dir = tempfile.mkdtemp(prefix='stumbler_tsv.')
+    convert = functools.partial(_convert, spill_dir=spill_dir,
+                                aggregated=args.aggregate, window=args.window,
+                                formatted=not args.sort and args.output_format == 'tsv',
+                                # Each worker sorts in its share of the memory.
+                                sort_memory=args.sort_memory * _MB // args.jobs if args.sort else None,
+                                max_error_rate=args.max_error_rate if args.tolerant else None,
+                                collect_stats=bool(args.stats or args.progress),
+                                progress_interval=args.progress)
+    # The tasks of each file: byte ranges with -j, otherwise the whole file.
+    if args.jobs > 1:
+        file_tasks = []
+        for filename in args.files:
+            if args.aggregate:
+                # Aggregate whole files, so the output matches a serial run.
+                file_tasks.append([(filename, args.format, None, None)])
+            else:
+                file_tasks.append(_file_tasks(filename, args.format, args.chunk_size * _MB))
+        tasks = list(itertools.chain.from_iterable(file_tasks))
+        pool = multiprocessing.Pool(args.jobs)
+        results = pool.imap(convert, tasks)
+    else:
+        file_tasks = [[(filename, args.format, None, None)] for filename in args.files]
+        tasks = list(itertools.chain.from_iterable(file_tasks))
+        pool = None
+        results = itertools.imap(convert, tasks)
+
+    failures = [0]
+    finished = [False]  # whether every result was taken
+    rejects = wifi.Rejects(args.max_error_rate)
+    run_stats = stats.Stats()
+    quarantine = open(args.quarantine, 'w') if args.quarantine else None
+
+    def iter_outputs():
+        # imap() yields results in task order, so the output is the same as a
+        # serial run no matter which worker finishes first. A file's ranges
+        # are held until all of them have converted: if one fails, the whole
+        # file is skipped, as it is in a serial run.
+        i = 0
+        for file_task_list in file_tasks:
+            converted = []  # (task number, label, _Spill or _Runs, rejects)
+            failed = False
+            line_offset = 0  # lines in the file's ranges so far
+            try:
+                for task in file_task_list:
+                    (output, error, task_rejects, task_stats) = next(results)
+                    i += 1
+                    (filename, format, start, end) = task
+                    if task_stats is not None:
+                        run_stats.merge(task_stats)
+                    if task_rejects is not None:
+                        if quarantine is not None:
+                            _write_quarantine(quarantine, filename, line_offset, task_rejects)
+                        line_offset += task_rejects.last_line
+                    label = filename if start is None else '%s[%d:%d]' % (filename, start, end)
+                    if error is not None:
+                        failures[0] += 1
+                        failed = True
+                        logging.error('[%d/%d] %s failed:\n%s', i, len(tasks), label, error)
+                        continue
+                    converted.append((i, label, output, task_rejects))
+                if failed:
+                    # A failed file doesn't count towards the run's error rate.
+                    if converted:
+                        logging.error('Skipping %s: %d of its ranges failed', filename,
+                                      len(file_task_list) - len(converted))
+                    continue
+                for (n, label, output, task_rejects) in converted:
+                    if task_rejects is not None:
+                        rejects.merge(task_rejects)
+                try:
+                    rejects.check_rate()
+                except wifi.ErrorRateExceeded as e:
+                    failures[0] += 1
+                    logging.error('Stopping: %s', e)
+                    return
+                for (n, label, output, task_rejects) in converted:
+                    yield output
+                    logging.info('[%d/%d] %s: %d rows', n, len(tasks), label, output.rows)
+            finally:
+                for (n, label, output, task_rejects) in converted:
+                    output.discard()
+        finished[0] = True
+
+    if args.output_format == 'sqlite':
+        output = None  # the writer opens the database itself
+    elif args.output:
+        output = open(args.output, 'wb' if args.output_format == 'apbin' or args.compress else 'w')
+    else:
+        output = sys.stdout
+    stream = compression.ParallelGzipWriter(output, args.jobs) if args.compress else output
+    try:
+        if args.output_format == 'sqlite':
+            writer = sqlite_writer.SQLiteWriter(args.output, args.bssid_summary)
+        elif args.output_format == 'apbin':
+            writer = apbin.APBinWriter(output)
+        elif args.tile_size is not None:
+            writer = tiles.TiledTSVWriter(output, tiles.index_filename(args.output), args.tile_size)
+        else:
+            writer = TSVWriter(stream, summary=args.aggregate)
+        if args.sort or args.output_format != 'tsv':
+            def write(chunk, rows):
+                writer.write_batch(chunk)
+        else:
+            write = writer.write_formatted
+        with writer:
+            if args.sort:
+                chunks = _sorted_chunks(iter_outputs(), args.unique, spill_dir)
+            else:
+                chunks = itertools.chain.from_iterable(iter_outputs())
+            for chunk, rows in chunks:
+                write_start = stats.clock()
+                write(chunk, rows)
+                run_stats.seconds['write'] += stats.clock() - write_start
+        run_stats.count('rows_out', writer.rows_written)
+    finally:
+        if pool is not None:
+            # If the run stopped early, the files still queued would only be
+            # converted to be deleted.
+            if finished[0]:
+                pool.close()
+            else:
+                pool.terminate()
+            pool.join()
+        shutil.rmtree(spill_dir)
+        if stream is not output:
+            stream.close()
+        if quarantine is not None:
+            quarantine.close()
+        if rejects.rejected:
+            logging.warning('Rejected %d of %d rows: %s', rejects.rejected, rejects.rows,
+                            ', '.join('%s %d' % item for item in sorted(rejects.reasons.iteritems())))
+        if output is not None and output is not sys.stdout:
+            output.close()
+
+    if args.stats:
+        report = run_stats.report(stats.clock() - started)
+        report.update(files=len(args.files), failed=failures[0])
+        report['dropped']['rejected'] = rejects.rejected
+        report['rejects'] = rejects.reasons
+        with open(args.stats, 'w') as file:
+            json.dump(report, file, indent=1, sort_keys=True)
+            file.write('\n')
+
+    return 1 if failures[0] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import argparse
+import os
+import random
+import re
+import sqlite3
+import sys
+
+# Synthetic inputs of any size for each format, made from the test fixtures.
+# A fixture is split into a header, record templates and a footer. Records
+# are drawn from the templates at random, with their BSSIDs replaced by
+# BSSIDs from a pool (so BSSIDs repeat, as in real files) and their
+# coordinates (and other decimals, like altitudes) moved by up to about a
+# kilometer. Everything else, including the BSSID's spelling (case, leading
+# zeros), is kept, so every format's converter accepts the records and takes
+# the same code paths as for the fixture. WiGLE ~-separated files have no
+# fixture in tests/, so theirs is inline. iPhone consolidated.db databases
+# are made from the CSV export's fixture, one table row per record.
+#
+#   ./tsv/synth.py --format gmon --rows 1000000 -o gmon.txt
+
+_TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests')
+
+# format: (fixture, record regex or None for one record per line)
+FIXTURES = {
+    'gmon': ('gmon.txt', None),
+    'iphone_consolidated_db': ('iphone_consolidated_db.csv', None),
+    'iphone_consolidated_sqlite': ('iphone_consolidated_db.csv', None),
+    'kismet_csv': ('kismet.csv', None),
+    'kismet_gpsxml': ('kismet.gpsxml', r'[ \t]*<gps-point [^>]*/>\n'),
+    'ns1': ('kismac.ns1', None),
+    'openwlanmap': ('openwlanmap.csv', None),
+    'wififofum_kml': ('wififofum.kml', r'<Placemark>.*?</Placemark>\n'),
+    'wigle_csv': ('wigle.csv', None),
+    'wigle_kml': ('wigle.kml', r'<Placemark>.*?</Placemark>\n'),
+    'wigle_tildesv': ('wigle_tildesv.txt', None),
+}
+
+# Fixtures that aren't in tests/, for formats without a sample file.
+_INLINE_FIXTURES = {
+    'wigle_tildesv.txt': (
+        'netid~ssid~trilat~trilong~firsttime~channel~qos~flags~wep~lasttime~transid\n'
+        '00:06:25:61:04:d0~linksys macHOME~37.78773880~-122.40343475~2002-05-17 00:00:00~6~0~0001~N~2004-05-03 00:00:00~20020605\n'
+        '00:40:96:5a:e7:d0~<no ssid>~37.79486847~-122.39928436~2002-12-28 00:00:00~1~2~ ~?~2004-05-03 00:00:00~20021228\n'
+        '00:09:43:d0:40:00~~37.79016495~-122.40024567~2003-06-30 00:00:00~11~0~ ~?~2004-05-03 00:00:00~20031230\n'
+        '00:02:2d:09:3f:f0~@SG-WIRELESS~37.79180145~-122.40235138~0000-00-00 00:00:00~6~2~17~?~2004-05-03 00:00:00~20030714\n'
+        '00:03:93:e8:a2:55~rubynet~37.78656387~-122.40242004~2003-04-26 00:00:00~1~0~0411~2~2004-05-03 00:00:00~20030426\n'),
+}
+
+# Formats written as SQLite databases rather than text: format: (CREATE TABLE
+# statement, INSERT statement). The fixture's records are CSV rows with one
+# value per column. Every record gets its own BSSID, which is the table's
+# primary key.
+_DATABASES = {
+    'iphone_consolidated_sqlite': (
+        'CREATE TABLE WifiLocation (MAC TEXT, Timestamp FLOAT, Latitude FLOAT, Longitude FLOAT, '
+        'HorizontalAccuracy FLOAT, Altitude FLOAT, VerticalAccuracy FLOAT, Speed FLOAT, '
+        'Course FLOAT, Confidence INTEGER, PRIMARY KEY (MAC))',
+        'INSERT OR REPLACE INTO WifiLocation VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'),
+}
+
+# Colon-separated BSSIDs, or bare ones like OpenWLANMap's.
+_BSSID_RE = re.compile(r'(?<![0-9A-Fa-f:.])(?:[0-9A-Fa-f]{1,2}(?::[0-9A-Fa-f]{1,2}){5}|[0-9A-Fa-f]{12})'
+                       r'(?![0-9A-Fa-f:.])')
+_COORDINATE_RE = re.compile(r'(?<![\d.])(-?)(\d{1,3})\.(\d{4,})(?![\d.])')
+
+_JITTER_DEGREES = 0.01
+
+
+def _split_fixture(text, record_re):
+    # (header, record templates, footer). Line formats' headers are the lines
+    # before the first line with a BSSID.
+    if record_re is None:
+        lines = text.splitlines(True)
+        first = 0
+        while first < len(lines) and not _BSSID_RE.search(lines[first]):
+            first += 1
+        records = [line if line.endswith('\n') else line + '\n' for line in lines[first:] if line.strip()]
+        return (''.join(lines[:first]), records, '')
+    matches = list(re.finditer(record_re, text, re.DOTALL))
+    if not matches:
+        raise ValueError('No records in fixture')
+    return (text[:matches[0].start()], [match.group(0) for match in matches], text[matches[-1].end():])
+
+
+def _format_bssid(bssid, template):
+    # bssid spelled like the template BSSID: the same case and the same
+    # groups without leading zeros.
+    if ':' not in template:
+        bssid = '%012x' % bssid
+        return bssid.upper() if template != template.lower() else bssid
+    groups = []
+    for i, group in enumerate(template.split(':')):
+        byte = (bssid >> (8 * (5 - i))) & 0xff
+        groups.append('%02x' % byte if len(group) == 2 else '%x' % byte)
+    bssid = ':'.join(groups)
+    return bssid.upper() if template != template.lower() else bssid
+
+
+def _format_coordinate(match, rnd):
+    # Zeros are missing values (null island) and stay zero.
+    (sign, whole, fraction) = match.groups()
+    value = float(sign + whole + '.' + fraction)
+    if not value:
+        return match.group(0)
+    return '%.*f' % (len(fraction), value + rnd.uniform(-_JITTER_DEGREES, _JITTER_DEGREES))
+
+
+def iter_records(records, rows, bssids=None, seed=0):
+    # rows records made from the templates, using a pool of bssids BSSIDs
+    # (default: a quarter of rows). With at least rows BSSIDs, like in an
+    # OpenWLANMap dump, each BSSID is drawn at random instead of from a pool,
+    # so full-size dumps don't need a pool of tens of millions.
+    rnd = random.Random(seed)
+    if bssids is not None and bssids >= rows:
+        def replace_bssid(match):
+            return _format_bssid(rnd.getrandbits(48), match.group(0))
+    else:
+        pool = [rnd.getrandbits(48) for i in xrange(max(1, bssids or rows // 4))]
+
+        def replace_bssid(match):
+            return _format_bssid(rnd.choice(pool), match.group(0))
+
+    def replace_coordinate(match):
+        return _format_coordinate(match, rnd)
+
+    for i in xrange(rows):
+        record = rnd.choice(records)
+        record = _BSSID_RE.sub(replace_bssid, record)
+        yield _COORDINATE_RE.sub(replace_coordinate, record)
+
+
+def _read_fixture(fixture):
+    if fixture in _INLINE_FIXTURES:
+        return _INLINE_FIXTURES[fixture]
+    with open(os.path.join(_TESTS_DIR, fixture), 'rb') as f:
+        return f.read()
+
+
+def _write_database(statements, records, file):
+    # SQLite writes the database itself, to the file's name.
+    if not os.path.isfile(getattr(file, 'name', '')):
+        raise ValueError('SQLite databases must be written to a file')
+    (create, insert) = statements
+    connection = sqlite3.connect(file.name)
+    try:
+        connection.execute(create)
+        connection.executemany(insert, ([value.strip('"') for value in record.rstrip('\n').split(',')]
+                                        for record in records))
+        connection.commit()
+    finally:
+        connection.close()
+    return os.path.getsize(file.name)
+
+
+def write_synthetic(format, rows, file, bssids=None, seed=0):
+    # Writes a synthetic input of rows records to file and returns its size.
+    (fixture, record_re) = FIXTURES[format]
+    (header, records, footer) = _split_fixture(_read_fixture(fixture), record_re)
+    if format in _DATABASES:
+        return _write_database(_DATABASES[format], iter_records(records, rows, rows, seed), file)
+    size = len(header) + len(footer)
+    file.write(header)
+    buffer = []
+    for record in iter_records(records, rows, bssids, seed):
+        buffer.append(record)
+        size += len(record)
+        if len(buffer) >= 4096:
+            file.write(''.join(buffer))
+            buffer = []
+    file.write(''.join(buffer))
+    file.write(footer)
+    return size
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Generate synthetic Wi-Fi stumbler files from the test fixtures')
+    parser.add_argument('--format', required=True, choices=sorted(FIXTURES))
+    parser.add_argument('--rows', type=int, required=True, help='number of records')
+    parser.add_argument('--bssids', type=int,
+                        help='number of distinct BSSIDs (default: a quarter of --rows)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args(argv[1:])
+    if args.format in _DATABASES and not args.output:
+        parser.error('--format %s requires --output' % args.format)
+    return args
+
+
+def main(argv):
+    args = _parse_args(argv)
+    if args.output:
+        with open(args.output, 'wb') as file:
+            write_synthetic(args.format, args.rows, file, args.bssids, args.seed)
+    else:
+        write_synthetic(args.format, args.rows, sys.stdout, args.bssids, args.seed)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
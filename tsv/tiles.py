@@ -0,0 +1,190 @@
+from __future__ import absolute_import, division
+
+import json
+import math
+
+from writer import TSVWriter, format_ap
+
+# Tiled .tsv output. TiledTSVWriter groups rows by a fixed latitude/longitude
+# grid as it writes them, so each tile's rows are stored in a few contiguous
+# byte ranges of the .tsv file, and writes a JSON index of those ranges next to
+# it. iter_bbox_rows() then reads only the tiles that cover a bounding box
+# instead of scanning the whole file.
+#
+# The index looks like:
+#
+#   {"version": 1, "tile_size": 1.0,
+#    "tiles": {"47,-123": [[offset, length], ...], ...}}
+#
+# where a tile "i,j" holds the rows with i <= latitude / tile_size < i + 1 and
+# j <= longitude / tile_size < j + 1.
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.tiles.json'
+
+_READ_SIZE = 1 << 20
+
+
+def index_filename(filename):
+    return filename + INDEX_SUFFIX
+
+
+def tile_of(latitude, longitude, tile_size):
+    return (int(math.floor(latitude / tile_size)), int(math.floor(longitude / tile_size)))
+
+
+def _tile_key(tile):
+    return '%d,%d' % tile
+
+
+def _printed(degrees):
+    # degrees as written to a .tsv row (writer._ROW_FORMAT's %f), so a row is
+    # indexed in the tile that iter_bbox_rows() finds it in.
+    return float('%f' % degrees)
+
+
+def _row_tile(row, tile_size):
+    (bssid, timestamp, latitude, longitude, rest) = row.split('\t', 4)
+    return tile_of(float(latitude), float(longitude), tile_size)
+
+
+# A TSVWriter for a seekable output file that buffers up to buffer_size bytes
+# of rows per tile, writes each tile's rows as one block and records the
+# blocks in an index written by close(). Larger buffers mean fewer, longer
+# ranges per tile.
+class TiledTSVWriter(TSVWriter):
+    def __init__(self, stream, index_filename, tile_size=1.0, buffer_size=16 << 20,
+                 flush_size=1 << 20, header=True):
+        TSVWriter.__init__(self, stream, flush_size, header)
+        self._index_filename = index_filename
+        self._tile_size = tile_size
+        self._buffer_size = buffer_size
+        self._tiles = {}  # tile -> [rows]
+        self._tile_buffered = 0
+        self._ranges = {}  # tile -> [[offset, length]]
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _append_row(self, tile, row):
+        # row includes its newline.
+        try:
+            self._tiles[tile].append(row)
+        except KeyError:
+            self._tiles[tile] = [row]
+        self._tile_buffered += len(row)
+        if self._tile_buffered >= self._buffer_size:
+            self._write_tiles()
+
+    def _write_tiles(self):
+        # _append() may call flush(), which comes back here, so take the
+        # buffered tiles first.
+        buffered = self._tiles
+        self._tiles = {}
+        self._tile_buffered = 0
+        for tile in sorted(buffered):
+            rows = buffered[tile]
+            data = "".join(rows)
+            # Offset of data once everything already buffered is flushed.
+            offset = self.bytes_written + self._buffered
+            ranges = self._ranges.setdefault(tile, [])
+            if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+                ranges[-1][1] += len(data)
+            else:
+                ranges.append([offset, len(data)])
+            self._append(data, len(rows))
+
+    def write(self, ap):
+        tile = tile_of(_printed(ap.latitude), _printed(ap.longitude), self._tile_size)
+        self._append_row(tile, format_ap(ap) + "\n")
+
+    def write_batch(self, aps):
+        for ap in aps:
+            self.write(ap)
+
+    def write_formatted(self, chunk, rows):
+        # chunk is rows already formatted by format_aps().
+        for row in chunk.splitlines(True):
+            self._append_row(_row_tile(row, self._tile_size), row)
+
+    def flush(self):
+        self._write_tiles()
+        TSVWriter.flush(self)
+
+    def close(self):
+        self.flush()
+        index = {'version': INDEX_VERSION,
+                 'tile_size': self._tile_size,
+                 'tiles': dict((_tile_key(tile), ranges) for (tile, ranges) in self._ranges.iteritems())}
+        with open(self._index_filename, 'w') as file:
+            json.dump(index, file, sort_keys=True)
+
+
+def load_index(filename):
+    with open(filename, 'r') as file:
+        index = json.load(file)
+    if index.get('version') != INDEX_VERSION:
+        raise ValueError('Unsupported tile index version: %s' % filename)
+    return index
+
+
+def _bbox_tiles(south, west, north, east, tile_size):
+    (low_i, low_j) = tile_of(south, west, tile_size)
+    (high_i, high_j) = tile_of(north, east, tile_size)
+    for i in xrange(low_i, high_i + 1):
+        for j in xrange(low_j, high_j + 1):
+            yield (i, j)
+
+
+def _bbox_ranges(index, south, west, north, east):
+    # Byte ranges of the tiles covering the box in file order, with adjacent
+    # ranges joined.
+    tile_size = index['tile_size']
+    tiles = index['tiles']
+    if west <= east:
+        boxes = [(south, west, north, east)]
+    else:
+        # The box crosses the antimeridian.
+        boxes = [(south, west, north, 180), (south, -180, north, east)]
+    ranges = []
+    for box in boxes:
+        for tile in _bbox_tiles(*(box + (tile_size,))):
+            ranges.extend(tiles.get(_tile_key(tile), ()))
+    ranges.sort()
+    joined = []
+    for (offset, length) in ranges:
+        if joined and joined[-1][0] + joined[-1][1] == offset:
+            joined[-1][1] += length
+        elif not joined or joined[-1][0] != offset:
+            joined.append([offset, length])
+    return joined
+
+
+def _in_bbox(latitude, longitude, south, west, north, east):
+    if not south <= latitude <= north:
+        return False
+    if west <= east:
+        return west <= longitude <= east
+    return longitude >= west or longitude <= east
+
+
+def iter_bbox_rows(filename, south, west, north, east, index=None):
+    # Yields the rows (with newlines) of a tiled .tsv file that lie within the
+    # bounding box, reading only the tiles that cover it.
+    if index is None:
+        index = load_index(index_filename(filename))
+    with open(filename, 'rb') as file:
+        for (offset, length) in _bbox_ranges(index, south, west, north, east):
+            file.seek(offset)
+            pending = ''
+            while length > 0:
+                data = file.read(min(length, _READ_SIZE))
+                if not data:
+                    break
+                length -= len(data)
+                rows = (pending + data).split('\n')
+                pending = rows.pop()
+                for row in rows:
+                    (bssid, timestamp, latitude, longitude, rest) = row.split('\t', 4)
+                    if _in_bbox(float(latitude), float(longitude), south, west, north, east):
+                        yield row + '\n'
@@ -0,0 +1,76 @@
+from __future__ import absolute_import, division
+
+import datetime
+
+# Fixed-layout replacements for time.strptime() + calendar.timegm(). Converters
+# parse millions of rows that share a few hundred distinct days, so the epoch
+# seconds of each date string are memoized and only the time of day is parsed
+# per row. Invalid dates and times raise ValueError, like strptime.
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+_MAX_CACHED_DATES = 1 << 16
+_date_cache = {}
+
+
+def _date_seconds(date):
+    # 'YYYY-MM-DD' or 'YYYY/MM/DD'
+    try:
+        return _date_cache[date]
+    except KeyError:
+        pass
+    if len(date) != 10 or date[4] not in '-/' or date[7] != date[4]:
+        raise ValueError('Bad date: "%s"' % date)
+    year, month, day = date[0:4], date[5:7], date[8:10]
+    if not (year + month + day).isdigit():
+        raise ValueError('Bad date: "%s"' % date)
+    seconds = (datetime.date(int(year), int(month), int(day)).toordinal() - _EPOCH_ORDINAL) * _SECONDS_PER_DAY
+    if len(_date_cache) >= _MAX_CACHED_DATES:
+        _date_cache.clear()
+    _date_cache[date] = seconds
+    return seconds
+
+
+def _time_seconds(time_):
+    # 'HH:MM:SS'
+    if len(time_) != 8 or time_[2] != ':' or time_[5] != ':':
+        raise ValueError('Bad time: "%s"' % time_)
+    hours, minutes, seconds = time_[0:2], time_[3:5], time_[6:8]
+    if not (hours + minutes + seconds).isdigit():
+        raise ValueError('Bad time: "%s"' % time_)
+    hours, minutes, seconds = int(hours), int(minutes), int(seconds)
+    if hours > 23 or minutes > 59 or seconds > 61:  # strptime allows leap seconds
+        raise ValueError('Bad time: "%s"' % time_)
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _utc_offset_seconds(offset):
+    # '+HHMM' or '-HHMM'
+    if len(offset) != 5 or offset[0] not in '+-' or not offset[1:].isdigit():
+        raise ValueError('Bad UTC offset: "%s"' % offset)
+    hours, minutes = int(offset[1:3]), int(offset[3:5])
+    if minutes > 59:
+        raise ValueError('Bad UTC offset: "%s"' % offset)
+    seconds = hours * 3600 + minutes * 60
+    return -seconds if offset[0] == '-' else seconds
+
+
+def from_date_time(date, time_):
+    # Seconds since the epoch for a UTC date 'YYYY-MM-DD' (or 'YYYY/MM/DD')
+    # and time of day 'HH:MM:SS'.
+    return _date_seconds(date) + _time_seconds(time_)
+
+
+def parse_datetime(s):
+    # 'YYYY-MM-DD HH:MM:SS' in UTC
+    if len(s) != 19 or s[10] != ' ':
+        raise ValueError('Bad datetime: "%s"' % s)
+    return _date_seconds(s[0:10]) + _time_seconds(s[11:19])
+
+
+def parse_datetime_with_offset(s):
+    # 'YYYY-MM-DD HH:MM:SS +HHMM'
+    if len(s) != 25 or s[19] != ' ':
+        raise ValueError('Bad datetime: "%s"' % s)
+    return parse_datetime(s[0:19]) - _utc_offset_seconds(s[20:25])
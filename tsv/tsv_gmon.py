@@ -2,67 +2,71 @@
 
 from __future__ import absolute_import, division
 
-import calendar
-import logging
 import re
 import sys
-import time
 
+import bssids
+import delimited
+import timestamps
 import wifi
+from delimited import Column, VariableColumn
 
 # BSSID;LAT;LON;SSID;Crypt;Beacon Interval;Connection Mode;Channel;RXL;Date;Time
 
-_R = re.compile(r"""((?:[0-9A-F]{2}:){5}[0-9A-F]{2});           # BSSID
-                    ((?:NaN|(?:-?\?)|(?:-?\d{1,2}(?:\.\d+)?))); # Latitude
-                    ((?:NaN|(?:-?\?)|(?:-?\d{1,3}(?:\.\d+)?))); # Longitude
-                    (.{0,32});                                  # SSID
-                    (?:Open|Wep|WPA2|WpaPsk|\?);                # Security
-                    (?:-\d{2,4});                               # Beacon Interval
-                    (?:Infra|Open);                             # Connection Mode
-                    ([1-9]\d{0,2});                             # Channel
-                    (-\d{1,3});                                 # RXL
-                    ((?:19|20)?\d{2}/[0-2]\d/[0-3]\d);          # Date
-                    ([0-2]\d:[0-5]\d:[0-5]\d)                   # Time
-                    """, re.X)
-
-wifi.test_re(_R, 8, [
-    "00:00:C5:B2:18:7C;46.80945;7.14751;johannes;Wep;-81;Infra;7;-79;2013/12/04;18:00:33",
-    "FE:F5:28:D1:37:80;46.50299;6.48682;Passion-Cuisine;WpaPsk;-71;Infra;6;-66;2013/12/22;21:37:06",
-    "FE:F5:28:D1:38:70;46.52202;6.62910;kolal;WPA2;-90;Infra;13;-88;2014/01/01;04:05:53",
-    "00:14:A9:74:FA:40;46.20082;6.14352;((o)) ville-geneve;Open;-70;Infra;6;-68;2014/01/04;15:12:53",
-    "00:01:E3:A8:1B:A8;46.18885;6.09936;ConnectionPoint;?;-88;Infra;6;-86;2014/01/12;16:39:58",
-    "00:02:6F:5F:EA:76;NaN;NaN;bnet;WpaPsk;-5089;Infra;4;-90;2012/09/23;20:15:00",
+_SCHEMA = delimited.Schema(';', [
+    Column(r'((?:[0-9A-F]{2}:){5}[0-9A-F]{2})', bssids.parse),  # BSSID
+    Column(r'((?:NaN|(?:-?\?)|(?:-?\d{1,2}(?:\.\d+)?)))'),      # Latitude
+    Column(r'((?:NaN|(?:-?\?)|(?:-?\d{1,3}(?:\.\d+)?)))'),      # Longitude
+    VariableColumn(max_length=32),                              # SSID
+    Column(r'(?:Open|Wep|WPA2|WpaPsk|\?)'),                     # Security
+    Column(r'(?:-\d{2,4})'),                                    # Beacon Interval
+    Column(r'(?:Infra|Open)'),                                  # Connection Mode
+    Column(r'([1-9]\d{0,2})', int),                             # Channel
+    Column(r'(-\d{1,3})', int),                                 # RXL
+    Column(r'((?:19|20)?\d{2}/[0-2]\d/[0-3]\d)'),               # Date
+    Column(r'([0-2]\d:[0-5]\d:[0-5]\d)'),                       # Time
     ])
+_R = _SCHEMA.regex
 
 
-_lineno = 0
+def _test():
+    wifi.test_re(_R, 8, [
+        "00:00:C5:B2:18:7C;46.80945;7.14751;johannes;Wep;-81;Infra;7;-79;2013/12/04;18:00:33",
+        "FE:F5:28:D1:37:80;46.50299;6.48682;Passion-Cuisine;WpaPsk;-71;Infra;6;-66;2013/12/22;21:37:06",
+        "FE:F5:28:D1:38:70;46.52202;6.62910;kolal;WPA2;-90;Infra;13;-88;2014/01/01;04:05:53",
+        "00:14:A9:74:FA:40;46.20082;6.14352;((o)) ville-geneve;Open;-70;Infra;6;-68;2014/01/04;15:12:53",
+        "00:01:E3:A8:1B:A8;46.18885;6.09936;ConnectionPoint;?;-88;Infra;6;-86;2014/01/12;16:39:58",
+        "00:02:6F:5F:EA:76;NaN;NaN;bnet;WpaPsk;-5089;Infra;4;-90;2012/09/23;20:15:00",
+        ])
+
+
+_HEADER = "BSSID;LAT;LON;SSID;Crypt;Beacon Interval;Connection Mode;Channel;RXL;Date;Time"
+
+def sniff(prefix):
+    return prefix.lstrip().startswith(_HEADER)
+
+
+def _skip_header(lines):
+    # An empty file has no header.
+    line = next(lines, None)
+    if line is not None and not re.match(_HEADER, line.strip()):
+        raise wifi.ParseError('bad header: %s' % line.strip(), 'header')
 
-def _gmon_csv_parse_line(line):
-    global _lineno
-    _lineno += 1
-    if _lineno == 1:
-        assert re.match("BSSID;LAT;LON;SSID;Crypt;Beacon Interval;Connection Mode;Channel;RXL;Date;Time", line)
-        return None
 
-    m = _R.match(line)
-    if m is None:
-        print logging.error('no match: %s', line)
-        assert False
+def _gmon_csv_parse_line(line):
+    fields = _SCHEMA.parse(line)
+    if fields is None:
+        raise wifi.ParseError('no match: %s' % line, 'no_match')
 
-    (bssid, latitude, longitude, ssid, channel, signal, date_, time_) = m.groups()
+    (bssid, latitude, longitude, ssid, channel, signal, date_, time_) = fields
 
     if latitude == "NaN" or longitude == "NaN":
         return None
 
-    bssid = wifi.canonicalize_bssid(bssid)
     latitude = float(latitude)
     longitude = float(longitude)
-    channel = int(channel)
-    signal = int(signal)
 
-    datetime = date_ + time_
-    st = time.strptime(datetime, '%Y/%m/%d%H:%M:%S')
-    timestamp = calendar.timegm(st)
+    timestamp = timestamps.from_date_time(date_, time_)
 
     return wifi.AP(timestamp=timestamp,
                    bssid=bssid,
@@ -73,7 +77,28 @@ def _gmon_csv_parse_line(line):
                    ssid=ssid)
 
 
-for filename in sys.argv[1:]:
-    with open(filename, 'r') as file:
-        _lineno = 0
-        wifi.print_as_tsv(file, _gmon_csv_parse_line)
+def iter_aps(file, rejects=None, stats=None):
+    with wifi.open_input(file) as file:
+        lines = iter(file)
+        _skip_header(lines)
+        for ap in wifi.parse_lines(lines, _gmon_csv_parse_line, first_line=2, rejects=rejects, stats=stats):
+            yield ap
+
+
+def iter_range_aps(filename, start, end, rejects=None, stats=None):
+    with open(filename, 'rb') as file:
+        lines = wifi.iter_range_lines(file, start, end)
+        if start == 0:
+            _skip_header(lines)
+        for ap in wifi.parse_lines(lines, _gmon_csv_parse_line, first_line=2 if start == 0 else 1, rejects=rejects, stats=stats):
+            yield ap
+
+
+def main(argv):
+    _test()
+    for filename in argv[1:]:
+        wifi.print_as_tsv(iter_aps(filename))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -2,23 +2,39 @@
 
 from __future__ import absolute_import, division
 
-import calendar
-import logging
-import re
 import sys
-import time
 
+import bssids
+import delimited
 import wifi
+from delimited import Column
 
 
-_R = re.compile('"((?:[0-9a-f]{1,2}:){5}[0-9a-f]{1,2})","(\d{9,}\.\d+)","(0|-?\d{1,2}\.\d+)","(0|-?1?\d{1,2}\.\d+)","(-1|\d{2,3})","0","-1","-1","-1","(0|50|60|65|68|70)"')
+_SCHEMA = delimited.Schema(',', [
+    Column(r'((?:[0-9a-f]{1,2}:){5}[0-9a-f]{1,2})', bssids.parse),  # BSSID
+    Column(r'(\d{9,}\.\d+)', float),                                # NSDate timestamp
+    Column(r'(0|-?\d{1,2}\.\d+)', float),                           # Latitude
+    Column(r'(0|-?1?\d{1,2}\.\d+)', float),                         # Longitude
+    Column(r'(-1|\d{2,3})', int),                                   # Signal
+    Column(r'0'),
+    Column(r'-1'),
+    Column(r'-1'),
+    Column(r'-1'),
+    Column(r'(0|50|60|65|68|70)', int),                             # Confidence
+    ], quote='"')
+_R = _SCHEMA.regex
 
-wifi.test_re(_R, 6, [
-    '"0:26:50:8c:a:31","298883375.530953","37.84438252","-122.25573939","82","0","-1","-1","-1","50"',
-    '"0:18:3f:f1:68:9","298883372.481177","37.84098821","-122.2467215","70","0","-1","-1","-1","50"',
-    '"0:22:57:98:b9:82","299216214.392777","37.88997","-122.13794016","60","0","-1","-1","-1","50"',
-    '"0:b:33:2:0:c","299278325.481233","0","0","-1","0","-1","-1","-1","0"',
-    ])
+def _test():
+    wifi.test_re(_R, 6, [
+        '"0:26:50:8c:a:31","298883375.530953","37.84438252","-122.25573939","82","0","-1","-1","-1","50"',
+        '"0:18:3f:f1:68:9","298883372.481177","37.84098821","-122.2467215","70","0","-1","-1","-1","50"',
+        '"0:22:57:98:b9:82","299216214.392777","37.88997","-122.13794016","60","0","-1","-1","-1","50"',
+        '"0:b:33:2:0:c","299278325.481233","0","0","-1","0","-1","-1","-1","0"',
+        ])
+
+
+def sniff(prefix):
+    return _R.match(prefix.lstrip()) is not None
 
 
 # http://nelsonslog.wordpress.com/2011/04/22/iphone-consolidated-db-location-tracking-notes/
@@ -27,22 +43,21 @@ def _timestamp_from_nsdate(nsdate):
     return int(nsdate + 978307200.5)
 
 
+def _check_confidence(confidence):
+    wifi.check('confidence', confidence, confidence in [0, 50, 60, 65, 68, 70])
+
+
 def _iphone_consolidated_db_parse_line(line):
-    m = _R.match(line)
-    if m is None:
-        print logging.error('no match: %s', line)
-        assert False
+    fields = _SCHEMA.parse(line)
+    if fields is None:
+        raise wifi.ParseError('no match: %s' % line, 'no_match')
 
-    (bssid, nsdate, latitude, longitude, signal, confidence) = m.groups()
+    (bssid, nsdate, latitude, longitude, signal, confidence) = fields
 
-    bssid = wifi.canonicalize_bssid(bssid)
-    timestamp = _timestamp_from_nsdate(float(nsdate))
-    latitude = float(latitude)
-    longitude = float(longitude)
-    signal = -int(signal)
+    timestamp = _timestamp_from_nsdate(nsdate)
+    signal = -signal
 
-    confidence = int(confidence)
-    wifi.check('confidence', confidence, confidence in [0, 50, 60, 65, 68, 70])
+    _check_confidence(confidence)
 
     return wifi.AP(timestamp=timestamp,
                    bssid=bssid,
@@ -50,6 +65,24 @@ def _iphone_consolidated_db_parse_line(line):
                    longitude=longitude)
 
 
-for filename in sys.argv[1:]:
-    with open(filename, 'r') as file:
-        wifi.print_as_tsv(file, _iphone_consolidated_db_parse_line)
+def iter_aps(file, rejects=None, stats=None):
+    with wifi.open_input(file) as file:
+        for ap in wifi.parse_lines(file, _iphone_consolidated_db_parse_line, rejects=rejects, stats=stats):
+            yield ap
+
+
+def iter_range_aps(filename, start, end, rejects=None, stats=None):
+    with open(filename, 'rb') as file:
+        lines = wifi.iter_range_lines(file, start, end)
+        for ap in wifi.parse_lines(lines, _iphone_consolidated_db_parse_line, rejects=rejects, stats=stats):
+            yield ap
+
+
+def main(argv):
+    _test()
+    for filename in argv[1:]:
+        wifi.print_as_tsv(iter_aps(filename))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import urllib
+
+import compression
+import wifi
+from tsv_iphone_consolidated_db import _check_confidence, _timestamp_from_nsdate
+
+# The iPhone's consolidated.db itself, rather than a CSV export of its
+# WifiLocation table (see tsv_iphone_consolidated_db.py). The table is read
+# with one query, fetched in batches, so memory use doesn't grow with the
+# size of the database.
+#
+# CREATE TABLE WifiLocation (MAC TEXT, Timestamp FLOAT, Latitude FLOAT, Longitude FLOAT,
+#     HorizontalAccuracy FLOAT, Altitude FLOAT, VerticalAccuracy FLOAT, Speed FLOAT,
+#     Course FLOAT, Confidence INTEGER, PRIMARY KEY (MAC))
+
+_MAGIC = 'SQLite format 3\x00'
+
+_QUERY = 'SELECT MAC, Timestamp, Latitude, Longitude, Confidence FROM WifiLocation'
+_FETCH_SIZE = 10000
+
+
+def sniff(prefix):
+    return prefix.startswith(_MAGIC)
+
+
+def _sqlite_takes_uris():
+    # SQLite only takes file: URIs if it was built with USE_URI.
+    probe = sqlite3.connect(':memory:')
+    try:
+        return ('USE_URI',) in probe.execute('PRAGMA compile_options').fetchall()
+    finally:
+        probe.close()
+
+
+def _copy_database(filename, temp_dir):
+    # Copies the database and its rollback journal or write-ahead log, if
+    # any, so SQLite can recover the copy as it would the original.
+    copy = os.path.join(temp_dir, os.path.basename(filename))
+    for suffix in ('', '-journal', '-wal'):
+        if os.path.exists(filename + suffix):
+            shutil.copyfile(filename + suffix, copy + suffix)
+    return copy
+
+
+def _connect(filename, temp_dir):
+    # Opens the database without changing its files: they are evidence. Even
+    # a query_only connection can roll back a journal or create -wal and -shm
+    # files when it opens a database, so without a mode=ro URI a copy made in
+    # temp_dir is opened instead.
+    if filename == compression.STDIN or compression.is_compressed(filename):
+        raise ValueError('SQLite databases must be uncompressed files: %s' % filename)
+    if not os.path.isfile(filename):
+        raise IOError('No such file: %s' % filename)
+    if _sqlite_takes_uris():
+        connection = sqlite3.connect('file:%s?mode=ro' % urllib.quote(os.path.abspath(filename)))
+    else:
+        connection = sqlite3.connect(_copy_database(filename, temp_dir))
+    connection.text_factory = str
+    return connection
+
+
+def _iter_rows(cursor):
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            break
+        for row in rows:
+            yield row
+
+
+def _iphone_consolidated_sqlite_parse_row(row):
+    (bssid, nsdate, latitude, longitude, confidence) = row
+
+    timestamp = _timestamp_from_nsdate(nsdate)
+
+    _check_confidence(confidence)
+
+    return wifi.AP(timestamp=timestamp,
+                   bssid=bssid,
+                   latitude=latitude,
+                   longitude=longitude)
+
+
+def iter_aps(file, rejects=None, stats=None):
+    temp_dir = tempfile.mkdtemp(prefix='consolidated_db.')
+    try:
+        connection = _connect(file, temp_dir)
+        try:
+            cursor = connection.cursor()
+            cursor.arraysize = _FETCH_SIZE
+            cursor.execute(_QUERY)
+            for ap in wifi.parse_rows(_iter_rows(cursor), _iphone_consolidated_sqlite_parse_row, rejects=rejects, stats=stats):
+                yield ap
+        finally:
+            connection.close()
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def main(argv):
+    for filename in argv[1:]:
+        wifi.print_as_tsv(iter_aps(filename))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import sys
+
+import wifi
+from tsv_ns1 import _parse_schema_line, _schema
+
+
+# Kismet's wi-scan CSV export: the NS1 text export's columns, separated by ';'
+# and without a header.
+#
+# Latitude;Longitude;( SSID );Type;( BSSID );Time (GMT);[ SNR Sig Noise ];# ( Name );Flags;Channelbits;BcnIntvl
+# N 50.8392167;E 4.3548333;( bombolong );ad-hoc;( 02:02:aa:6f:e1:ed );21:18:32 (GMT);[ 13 69 56 ];# (  );0002;0400;0
+
+# Kismet also writes '????' for an unknown type.
+_SCHEMA = _schema(';', r'(ad-hoc|I?BSS|\?{3,4})')
+_R = _SCHEMA.regex
+
+def _test():
+    wifi.test_re(_R, 9, [
+        'N 50.8414667;E 4.3660500;( bombolong );ad-hoc;( 02:02:cf:87:27:b5 );01:00:00 (GMT);[  76  ];# ( NULL );0002;0002;',
+        'N 50.8392167;E 4.3548333;( bombolong );???;( 00:02:dd:30:e2:4b );21:20:19 (GMT);[ 15 70 55 ];# ( Prism  I );0000;0000;0',
+        'S 0.0000000;W 0.0000000;( bombolong );ad-hoc;( b6:01:c4:01:9b:00 );11:10:36 (GMT);[ 39 88 49 ];# (  );0002;00000000;100',
+        'N 50.8583150;E 4.3966320;( bombolong );IBSS;( 02:00:E2:92:54:76 );07:11:22 (GMT);[ 10 10 0 ];# ( unknown );0002;0000;0',
+        'N 51.1731000;E 4.4496900;( bombolong );????;( 00:02:78:44:70:34 );15:57:00 (GMT);[ 0 328 328 ];# (  );0008;00000040;100',
+        ])
+
+
+def sniff(prefix):
+    return _SCHEMA.match(prefix.lstrip().split('\n', 1)[0]) is not None
+
+
+def _kismet_csv_parse_line(line):
+    return _parse_schema_line(_SCHEMA, line)
+
+
+def iter_aps(file, rejects=None, stats=None):
+    with wifi.open_input(file) as file:
+        for ap in wifi.parse_lines(file, _kismet_csv_parse_line, rejects=rejects, stats=stats):
+            yield ap
+
+
+def iter_range_aps(filename, start, end, rejects=None, stats=None):
+    with open(filename, 'rb') as file:
+        lines = wifi.iter_range_lines(file, start, end)
+        for ap in wifi.parse_lines(lines, _kismet_csv_parse_line, rejects=rejects, stats=stats):
+            yield ap
+
+
+def main(argv):
+    _test()
+    for filename in argv[1:]:
+        wifi.print_as_tsv(iter_aps(filename))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
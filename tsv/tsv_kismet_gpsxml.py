@@ -2,16 +2,9 @@
 
 from __future__ import absolute_import, division
 
-from xml.etree import ElementTree
-
-import calendar
-import logging
-import string
 import sys
-import time
-
-from record import Record
 
+import bssids
 import wifi
 
 """
@@ -27,90 +20,54 @@ import wifi
 """
 
 
-_PLACEMARK_TAG = '{http://earth.google.com/kml/2.2}Placemark'
-_NAME_TAG = '{http://earth.google.com/kml/2.2}name'
-_DESCRIPTION_TAG = '{http://earth.google.com/kml/2.2}description'
-_COORDINATES_TAG ='{http://earth.google.com/kml/2.2}Point/{http://earth.google.com/kml/2.2}coordinates'
-
-
-def _parse_description(description):
-    d = {}
-    description = description.split('<br>')
-    for kv in description:
-        key, value = kv.split(': ', 1)
-        d[key] = value
-
-    bssid = wifi.canonicalize_bssid(d['MAC'])
-    channel = int(d['Channel'])
-    signal = int(d['MaxRssi'])
-
-    security = d['Security']
-    if security not in ['None', 'Open', 'WEP', 'WPA', 'WPA2']:
-        raise ValueError('Bad security "%s"' % security)
-
-    # LastSeen: 'YYYY-MM-DD HH:MM:SS +0000'
-    KML_DATETIME_FORMAT_0000 = '%Y-%m-%d %H:%M:%S +0000'
-    KML_DATETIME_FORMAT_0700 = '%Y-%m-%d %H:%M:%S -0700'
-    KML_DATETIME_FORMAT_0800 = '%Y-%m-%d %H:%M:%S -0800'
-    last_seen = d['LastSeen']
-    try:
-        st = time.strptime(last_seen, KML_DATETIME_FORMAT_0000)
-    except:
-        try :
-            st = time.strptime(last_seen, KML_DATETIME_FORMAT_0700)
-        except:
-            st = time.strptime(last_seen, KML_DATETIME_FORMAT_0800)
-    timestamp = calendar.timegm(st)
-
-    return wifi.Record(bssid=bssid,
-                       channel=channel,
-                       signal=signal,
-                       timestamp=timestamp)
-
-
-def _parse_coordinates(coordinates):
-    coordinates = coordinates.split(',')
-    longitude = float(coordinates[0])
-    latitude = float(coordinates[1])
-    altitude = float(coordinates[2])
-    wifi.check('altitude', altitude, wifi.MIN_ALTITUDE <= altitude <= wifi.MAX_ALTITUDE)
-    return Record(latitude=latitude,
-                  longitude=longitude,
-                  altitude=altitude)
-
-
-def _parse_placemark(placemark):
-    def get(tagName):
-        return placemark.find(tagName).text
-    desc = _parse_description(get(_DESCRIPTION_TAG))
-    coordinates = _parse_coordinates(get(_COORDINATES_TAG))
-    return wifi.AP(timestamp=desc.timestamp,
-                   bssid=desc.bssid,
-                   latitude=coordinates.latitude,
-                   longitude=coordinates.longitude,
-                   channel=desc.channel,
-                   signal=desc.signal,
-                   ssid=ssid)
-
-
-def _print_kml_as_tsv(filename):
-    etree = ElementTree.iterparse(filename)
-    for event, element in etree:
-        if element.tag == _PLACEMARK_TAG:
-            try:
-                ap = _parse_placemark(element)
-                if ap is not None:
-                    wifi.print_ap(ap)
-            except:
-                error = sys.exc_info()[1]
-                def get(tagName):
-                    return element.find(tagName).text
-                logging.error(error)
-                assert False
-
-
-for filename in sys.argv[1:]:
-    _print_kml_as_tsv(filename)
+_GPS_POINT_TAG = 'gps-point'
+
+# Pseudo-BSSIDs Kismet uses for GPS track points and broadcast probes.
+_TRACK_BSSID = 'GP:SD:TR:AC:KL:OG'
+_BROADCAST_BSSID = 'FF:FF:FF:FF:FF:FF'
+
+
+def sniff(prefix):
+    return '<gps-run' in prefix
+
+
+def _parse_gps_point(point):
+    get = point.attrib.get
+    bssid = get('bssid')
+    if bssid == _TRACK_BSSID or bssid.upper() == _BROADCAST_BSSID:
+        return None
+
+    bssid = bssids.parse(bssid)
+    timestamp = int(get('time-sec'))
+    latitude = float(get('lat'))
+    longitude = float(get('lon'))
+    altitude = float(get('alt'))
+    signal = int(get('signal_dbm'))
+
+    if altitude < wifi.MIN_ALTITUDE or altitude > wifi.MAX_ALTITUDE:
+        altitude = 0
+
+    return wifi.AP(timestamp=timestamp,
+                   bssid=bssid,
+                   latitude=latitude,
+                   longitude=longitude,
+                   altitude=altitude,
+                   signal=signal)
+
+
+def iter_aps(file, rejects=None, stats=None):
+    elements = wifi.iterparse_elements(file, _GPS_POINT_TAG)
+    for ap in wifi.parse_elements(elements, _parse_gps_point, rejects=rejects, stats=stats):
+        yield ap
+
+
+def main(argv):
+    for filename in argv[1:]:
+        wifi.print_as_tsv(iter_aps(filename))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
 
 
 """
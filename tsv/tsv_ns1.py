@@ -2,38 +2,57 @@
 
 from __future__ import absolute_import, division
 
-import calendar
-import logging
-import re
 import sys
-import time
 
+import bssids
+import delimited
+import timestamps
 import wifi
+from delimited import Column, VariableColumn
 
 
 # Latitude	Longitude	( SSID )	Type	( BSSID )	Time (GMT)	[ SNR Sig Noise ]	# ( Name )	Flags	Channelbits	BcnIntvl
 # N 43.6477510	W 79.3932570	( aghq2 )	BSS	( 90:27:E4:5E:65:B1 )	05:38:01 (GMT)	[ 12 12 0 ]	# ( Apple )	0011	0000	0
 
-_R = re.compile('([NS]) (\d{1,3}\.\d+)\t([EW]) (\d{1,3}\.\d+)\t\( (.+) \)\t(ad-hoc|I?BSS|\?\?\?)\t\( ((?:[0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}) \)\t(\d\d:\d\d:\d\d \(GMT\))\t\[ +(\d+) +(?:\d+ \d+ )?\]\t#')
+# The columns of NS1's text export, which Kismet's CSV export shares (see
+# tsv_kismet_csv.py). The regex ignores the columns after '#'.
+def _schema(delimiter, type_pattern):
+    return delimited.Schema(delimiter, [
+        Column(r'([NS]) (\d{1,3}\.\d+)'),                                       # Latitude
+        Column(r'([EW]) (\d{1,3}\.\d+)'),                                       # Longitude
+        VariableColumn(min_length=1, prefix='( ', suffix=' )'),                 # ( SSID )
+        Column(type_pattern),                                                   # Type
+        Column(r'\( ((?:[0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}) \)', bssids.parse),  # ( BSSID )
+        Column(r'(\d\d:\d\d:\d\d \(GMT\))'),                                    # Time (GMT)
+        Column(r'\[ +(\d+) +(?:\d+ \d+ )?\]', int),                             # [ SNR Sig Noise ]
+        Column(r'#'),                                                           # # ( Name )
+        ])
 
-wifi.test_re(_R, 9, [
-    'N 43.6477510	W 79.3932570	( aghq2 )	BSS	( 90:27:E4:5E:65:B1 )	05:38:01 (GMT)	[ 12 12 0 ]	# ( Apple )	0011	0000	0',
-    'N 43.6477510	W 79.3932570	( hhonors )	BSS	( 00:23:5D:8D:40:F0 )	05:38:01 (GMT)	[ 37 37 0 ]	# ( Cisco Systems )	0001	0000	0',
-    'N 43.6465990	W 79.3943710	( HP8C116C )	IBSS	( 02:2A:2A:6E:AF:6B )	05:36:28 (GMT)	[ 4 4 0 ]	# ( unknown )	0002	0000	0',
-    'N 50.8414667	E 4.3660500	( bombolong )	ad-hoc	( 02:02:cf:87:27:b5 )	01:00:00 (GMT)	[  76  ]	# ( NULL )	0002	0002	',
-    ])
+_SCHEMA = _schema('\t', r'(ad-hoc|I?BSS|\?\?\?)')
+_R = _SCHEMA.regex
 
+def _test():
+    wifi.test_re(_R, 9, [
+        'N 43.6477510	W 79.3932570	( aghq2 )	BSS	( 90:27:E4:5E:65:B1 )	05:38:01 (GMT)	[ 12 12 0 ]	# ( Apple )	0011	0000	0',
+        'N 43.6477510	W 79.3932570	( hhonors )	BSS	( 00:23:5D:8D:40:F0 )	05:38:01 (GMT)	[ 37 37 0 ]	# ( Cisco Systems )	0001	0000	0',
+        'N 43.6465990	W 79.3943710	( HP8C116C )	IBSS	( 02:2A:2A:6E:AF:6B )	05:36:28 (GMT)	[ 4 4 0 ]	# ( unknown )	0002	0000	0',
+        'N 50.8414667	E 4.3660500	( bombolong )	ad-hoc	( 02:02:cf:87:27:b5 )	01:00:00 (GMT)	[  76  ]	# ( NULL )	0002	0002	',
+        ])
 
-def _ns1_parse_line(line):
-    if line[0] == '#':
-        return None
 
-    m = _R.match(line)
-    if m is None:
-        logging.error('no match: %s', line)
-        assert False
+_HEADER = "# Latitude\tLongitude\t( SSID )\tType\t( BSSID )\tTime (GMT)\t[ SNR Sig Noise ]"
+
+def sniff(prefix):
+    return _HEADER in prefix
+
 
-    (ns, latitude, ew, longitude, ssid, bss, bssid, timeofday, snr) = m.groups()
+def _parse_schema_line(schema, line):
+    # An AP from a line of _schema()'s columns.
+    fields = schema.parse(line)
+    if fields is None:
+        raise wifi.ParseError('no match: %s' % line, 'no_match')
+
+    (ns, latitude, ew, longitude, ssid, bss, bssid, timeofday, snr) = fields
 
     latitude = float(latitude)
     if ns == 'S':
@@ -46,15 +65,11 @@ def _ns1_parse_line(line):
     NS1_EPOCH = "2012-04-25"
 
     # 05:38:01 (GMT)
-    st = time.strptime(NS1_EPOCH + ' ' + timeofday, '%Y-%m-%d %H:%M:%S (GMT)')
-    timestamp = calendar.timegm(st)
+    timestamp = timestamps.from_date_time(NS1_EPOCH, timeofday[:8])
 
-    snr = int(snr)
     wifi.check("snr", snr, 0 <= snr <= 99)
     dbm = -99 + snr # HACK
 
-    bssid = wifi.canonicalize_bssid(bssid)
-
     return wifi.AP(timestamp=timestamp,
                    bssid=bssid,
                    latitude=latitude,
@@ -63,6 +78,31 @@ def _ns1_parse_line(line):
                    ssid=ssid)
 
 
-for filename in sys.argv[1:]:
-    with open(filename, 'r') as file:
-        wifi.print_as_tsv(file, _ns1_parse_line)
+def _ns1_parse_line(line):
+    if line[0] == '#':
+        return None
+
+    return _parse_schema_line(_SCHEMA, line)
+
+
+def iter_aps(file, rejects=None, stats=None):
+    with wifi.open_input(file) as file:
+        for ap in wifi.parse_lines(file, _ns1_parse_line, rejects=rejects, stats=stats):
+            yield ap
+
+
+def iter_range_aps(filename, start, end, rejects=None, stats=None):
+    with open(filename, 'rb') as file:
+        lines = wifi.iter_range_lines(file, start, end)
+        for ap in wifi.parse_lines(lines, _ns1_parse_line, rejects=rejects, stats=stats):
+            yield ap
+
+
+def main(argv):
+    _test()
+    for filename in argv[1:]:
+        wifi.print_as_tsv(iter_aps(filename))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import sys
+
+import delimited
+import wifi
+from delimited import Column
+
+
+# OpenWLANMap database dumps: one row per BSSID, with the BSSID's estimated
+# position and no time, signal or SSID. Dumps have tens of millions of rows.
+#
+# bssid	lat	lon
+# 0014BF42FEA9	56.14879745453	10.203182022556
+
+# Every BSSID in a dump is different, so they are converted directly rather
+# than through bssids.parse()'s cache, which would only be thrashed.
+def _parse_bare_bssid(bssid):
+    return int(bssid, 16)
+
+_SCHEMA = delimited.Schema('\t', [
+    Column(r'([0-9A-Fa-f]{12})', _parse_bare_bssid),  # bssid
+    Column(r'(-?\d{1,3}(?:\.\d+)?)', float),           # lat
+    Column(r'(-?\d{1,3}(?:\.\d+)?)', float),           # lon
+    ])
+_R = _SCHEMA.regex
+
+def _test():
+    wifi.test_re(_R, 3, [
+        "0014BF42FEA9\t56.14879745453\t10.203182022556",
+        "00183FAEB531\t51.512612459074\t-0.13014171481481",
+        "001D19D8FF37\t53.5601989257\t9.909308973517",
+        ])
+
+
+_HEADER = "bssid\tlat\tlon"
+
+def sniff(prefix):
+    return prefix.startswith(_HEADER)
+
+
+def _skip_header(lines):
+    # An empty file has no header.
+    line = next(lines, None)
+    if line is not None and line.strip() != _HEADER:
+        raise wifi.ParseError('bad header: %s' % line.strip(), 'header')
+
+
+def _openwlanmap_parse_line(line):
+    fields = _SCHEMA.parse(line)
+    if fields is None:
+        raise wifi.ParseError('no match: %s' % line, 'no_match')
+
+    (bssid, latitude, longitude) = fields
+
+    return wifi.AP(timestamp=0,
+                   bssid=bssid,
+                   latitude=latitude,
+                   longitude=longitude)
+
+
+def iter_aps(file, rejects=None, stats=None):
+    with wifi.open_input(file) as file:
+        lines = iter(file)
+        _skip_header(lines)
+        for ap in wifi.parse_lines(lines, _openwlanmap_parse_line, first_line=2, rejects=rejects, stats=stats):
+            yield ap
+
+
+def iter_range_aps(filename, start, end, rejects=None, stats=None):
+    with open(filename, 'rb') as file:
+        lines = wifi.iter_range_lines(file, start, end)
+        if start == 0:
+            _skip_header(lines)
+        for ap in wifi.parse_lines(lines, _openwlanmap_parse_line, first_line=2 if start == 0 else 1, rejects=rejects, stats=stats):
+            yield ap
+
+
+def main(argv):
+    _test()
+    for filename in argv[1:]:
+        wifi.print_as_tsv(iter_aps(filename))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+from __future__ import absolute_import, division
+
+import sys
+
+import bssids
+import record
+import wifi
+from record import APRecord
+from writer import HEADER
+
+# Reads the project's own .tsv format (see README.md): tab-separated rows,
+# '#' comment lines and empty columns for missing values. The SSID is the last
+# column and is kept byte for byte, even if it contains tabs.
+
+_READ_SIZE = 1 << 20
+
+
+def sniff(prefix):
+    return prefix.startswith(HEADER)
+
+
+def _iter_lines(file, start=0, end=None):
+    # Lines (without newlines) of file that begin at byte offsets in
+    # [start, end), read in large chunks.
+    if start:
+        file.seek(start)
+    remaining = end - start if end is not None else None
+    pending = ''
+    while remaining is None or remaining > 0:
+        data = file.read(_READ_SIZE if remaining is None else min(_READ_SIZE, remaining))
+        if not data:
+            break
+        if remaining is not None:
+            remaining -= len(data)
+        lines = (pending + data).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def _parse_row(row):
+    # None for comments and empty lines.
+    if not row or row[0] == '#':
+        return None
+    fields = row.split('\t', 9)
+    if len(fields) != 10:
+        raise wifi.ParseError('Bad .tsv row: %r' % row, 'columns')
+    (bssid, timestamp, latitude, longitude, accuracy, altitude, altitude_accuracy,
+     channel, signal, ssid) = fields
+    try:
+        return APRecord(timestamp=int(timestamp),
+                        bssid=bssids.parse(bssid),
+                        latitude=float(latitude),
+                        longitude=float(longitude),
+                        accuracy=float(accuracy) if accuracy else None,
+                        altitude=float(altitude) if altitude else None,
+                        altitude_accuracy=float(altitude_accuracy) if altitude_accuracy else None,
+                        channel=int(channel) if channel else None,
+                        signal=int(signal) if signal else None,
+                        ssid=ssid)
+    except ValueError:
+        raise wifi.ParseError('Bad .tsv row: %r' % row, 'bad_value')
+
+
+def _revalidate_row(row):
+    # APRecord fields are in wifi.AP's argument order.
+    ap = _parse_row(row)
+    if ap is None:
+        return None
+    return wifi.AP(*ap)
+
+
+def _parse_lines(lines, revalidate, rejects, stats):
+    # Lines are not stripped: the SSID is kept byte for byte. Rows are
+    # filtered by wifi.drop_reason(), which only matters for rows not written
+    # by this project.
+    parse_row = _revalidate_row if revalidate else _parse_row
+    return wifi.parse_lines(lines, parse_row, rejects=rejects, stats=stats, strip=False)
+
+
+def iter_aps(file, revalidate=False, rejects=None, stats=None):
+    # With revalidate, rows are checked again by wifi.AP, for files written by
+    # older versions or other tools.
+    with wifi.open_input(file) as file:
+        for ap in _parse_lines(_iter_lines(file), revalidate, rejects, stats):
+            yield ap
+
+
+def iter_range_aps(filename, start, end, revalidate=False, rejects=None, stats=None):
+    with open(filename, 'rb') as file:
+        for ap in _parse_lines(_iter_lines(file, start, end), revalidate, rejects, stats):
+            yield ap
+
+
+def iter_batches(file, size=65536, revalidate=False):
+    # record.APBatch columns of up to size rows.
+    return record.iter_batches(iter_aps(file, revalidate), size)
+
+
+def main(argv):
+    # Rewrites .tsv files, checking every row with wifi.AP.
+    for filename in argv[1:]:
+        wifi.print_as_tsv(iter_aps(filename, revalidate=True))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -2,24 +2,23 @@
 
 from __future__ import absolute_import, division
 
-from xml.etree import ElementTree
-
-import calendar
-import logging
-import string
 import sys
-import time
-
-from record import Record
 
+import bssids
+import timestamps
 import wifi
 
+_KML_NAMESPACE = 'http://earth.google.com/kml/2.2'
 _PLACEMARK_TAG = '{http://earth.google.com/kml/2.2}Placemark'
 _NAME_TAG = '{http://earth.google.com/kml/2.2}name'
 _DESCRIPTION_TAG = '{http://earth.google.com/kml/2.2}description'
 _COORDINATES_TAG ='{http://earth.google.com/kml/2.2}Point/{http://earth.google.com/kml/2.2}coordinates'
 
 
+def sniff(prefix):
+    return 'xmlns="%s"' % _KML_NAMESPACE in prefix
+
+
 def _parse_ssid(ssid):
     ssid = ssid.encode('utf_8')
     MAX_SSID_LENGTH = 32
@@ -37,7 +36,7 @@ def _parse_description(description):
         key, value = kv.split(': ', 1)
         d[key] = value
 
-    bssid = wifi.canonicalize_bssid(d['MAC'])
+    bssid = bssids.parse(d['MAC'])
     channel = int(d['Channel'])
     signal = int(d['MaxRssi'])
 
@@ -46,23 +45,9 @@ def _parse_description(description):
         raise ValueError('Bad security "%s"' % security)
 
     # LastSeen: 'YYYY-MM-DD HH:MM:SS +0000'
-    KML_DATETIME_FORMAT_0000 = '%Y-%m-%d %H:%M:%S +0000'
-    KML_DATETIME_FORMAT_0700 = '%Y-%m-%d %H:%M:%S -0700'
-    KML_DATETIME_FORMAT_0800 = '%Y-%m-%d %H:%M:%S -0800'
-    last_seen = d['LastSeen']
-    try:
-        st = time.strptime(last_seen, KML_DATETIME_FORMAT_0000)
-    except:
-        try :
-            st = time.strptime(last_seen, KML_DATETIME_FORMAT_0700)
-        except:
-            st = time.strptime(last_seen, KML_DATETIME_FORMAT_0800)
-    timestamp = calendar.timegm(st)
-
-    return Record(bssid=bssid,
-                  channel=channel,
-                  signal=signal,
-                  timestamp=timestamp)
+    timestamp = timestamps.parse_datetime_with_offset(d['LastSeen'])
+
+    return (bssid, channel, signal, timestamp)
 
 
 def _parse_coordinates(coordinates):
@@ -71,48 +56,39 @@ def _parse_coordinates(coordinates):
     latitude = float(coordinates[1])
     altitude = float(coordinates[2])
     wifi.check('altitude', altitude, wifi.MIN_ALTITUDE <= altitude <= wifi.MAX_ALTITUDE)
-    return Record(latitude=latitude,
-                  longitude=longitude,
-                  altitude=altitude)
+    return (latitude, longitude, altitude)
 
 
 def _parse_placemark(placemark):
     def get(tagName):
         return placemark.find(tagName).text
     ssid = _parse_ssid(get(_NAME_TAG))
-    desc = _parse_description(get(_DESCRIPTION_TAG))
-    coordinates = _parse_coordinates(get(_COORDINATES_TAG))
-
-    return wifi.AP(timestamp=desc.timestamp,
-                   bssid=desc.bssid,
-                   latitude=coordinates.latitude,
-                   longitude=coordinates.longitude,
-                   altitude=coordinates.altitude,
-                   channel=desc.channel,
-                   signal=desc.signal,
+    (bssid, channel, signal, timestamp) = _parse_description(get(_DESCRIPTION_TAG))
+    (latitude, longitude, altitude) = _parse_coordinates(get(_COORDINATES_TAG))
+
+    return wifi.AP(timestamp=timestamp,
+                   bssid=bssid,
+                   latitude=latitude,
+                   longitude=longitude,
+                   altitude=altitude,
+                   channel=channel,
+                   signal=signal,
                    ssid=ssid)
 
 
-def _print_kml_as_tsv(filename):
-    etree = ElementTree.iterparse(filename)
-    for event, element in etree:
-        if element.tag == _PLACEMARK_TAG:
-            try:
-                ap = _parse_placemark(element)
-                if ap is not None:
-                    wifi.print_ap(ap)
-            except:
-                error = sys.exc_info()[1]
-                def get(tagName):
-                    return element.find(tagName).text
-                logging.warning(_parse_ssid(get(_NAME_TAG)))
-                logging.error(error)
-                assert False
-
-
-print '# Timestamp\tBSSID\tLatitude\tLongitude\tSignal\tChannel\tSSID'
-for filename in sys.argv[1:]:
-    _print_kml_as_tsv(filename)
+def iter_aps(file, rejects=None, stats=None):
+    elements = wifi.iterparse_elements(file, _PLACEMARK_TAG)
+    for ap in wifi.parse_elements(elements, _parse_placemark, rejects=rejects, stats=stats):
+        yield ap
+
+
+def main(argv):
+    for filename in argv[1:]:
+        wifi.print_as_tsv(iter_aps(filename))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
 
 
 """
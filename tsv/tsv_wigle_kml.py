@@ -2,26 +2,24 @@
 
 from __future__ import absolute_import, division
 
-from xml.etree import ElementTree
-
-import calendar
-import logging
 import re
-import string
 import sys
-import time
-
-from record import Record
 
+import bssids
 import wifi
 
 
+_KML_NAMESPACE = 'http://www.opengis.net/kml/2.2'
 _WIGLE_PLACEMARK_TAG = '{http://www.opengis.net/kml/2.2}Placemark'
 _NAME_TAG = '{http://www.opengis.net/kml/2.2}name'
 _DESCRIPTION_TAG = '{http://www.opengis.net/kml/2.2}description'
 _COORDINATES_TAG ='{http://www.opengis.net/kml/2.2}Point/{http://www.opengis.net/kml/2.2}coordinates'
 
 
+def sniff(prefix):
+    return 'xmlns="%s"' % _KML_NAMESPACE in prefix
+
+
 def _parse_ssid(ssid):
     ssid = ssid.encode('utf_8')
     MAX_SSID_LENGTH = 32
@@ -43,55 +41,46 @@ def _parse_description(description):
     # FIXME: Parse BSSIDs like "31040410_56978_2731527"
     if re.match("\d+_\d{5}_\d+", bssid):
         bssid = wifi.NULL_BSSID
-    bssid = wifi.canonicalize_bssid(bssid)
+    bssid = bssids.parse(bssid)
 
     channel = 0
     signal = 0
     timestamp = int(d['Timestamp']) // 1000
 
-    return wifi.Record(bssid=bssid,
-                       channel=channel,
-                       signal=signal,
-                       timestamp=timestamp)
+    return (bssid, channel, signal, timestamp)
 
 
 def _parse_coordinates(coordinates):
     coordinates = coordinates.split(',')
     longitude = float(coordinates[0])
     latitude = float(coordinates[1])
-    return Record(latitude=latitude, longitude=longitude)
+    return (latitude, longitude)
 
 
 def _parse_placemark(placemark):
     def get(tagName):
         return placemark.find(tagName).text
     ssid = _parse_ssid(get(_NAME_TAG))
-    desc = _parse_description(get(_DESCRIPTION_TAG))
-    coordinates = _parse_coordinates(get(_COORDINATES_TAG))
-    return wifi.AP(timestamp=desc.timestamp,
-                   bssid=desc.bssid,
-                   latitude=coordinates.latitude,
-                   longitude=coordinates.longitude,
-                   channel=desc.channel,
-                   signal=desc.signal,
+    (bssid, channel, signal, timestamp) = _parse_description(get(_DESCRIPTION_TAG))
+    (latitude, longitude) = _parse_coordinates(get(_COORDINATES_TAG))
+    return wifi.AP(timestamp=timestamp,
+                   bssid=bssid,
+                   latitude=latitude,
+                   longitude=longitude,
+                   channel=channel,
+                   signal=signal,
                    ssid=ssid)
 
-def _print_kml_as_tsv(filename):
-    etree = ElementTree.iterparse(filename)
-    for event, element in etree:
-        if element.tag == _WIGLE_PLACEMARK_TAG:
-            try:
-                ap = _parse_placemark(element)
-                if ap is not None:
-                    wifi.print_ap(ap)
-            except:
-                error = sys.exc_info()[1]
-                def get(tagName):
-                    return element.find(tagName).text
-                logging.warning(_parse_ssid(get(_NAME_TAG)))
-                logging.error(error)
-                assert False
-
-
-for filename in sys.argv[1:]:
-    _print_kml_as_tsv(filename)
+def iter_aps(file, rejects=None, stats=None):
+    elements = wifi.iterparse_elements(file, _WIGLE_PLACEMARK_TAG)
+    for ap in wifi.parse_elements(elements, _parse_placemark, rejects=rejects, stats=stats):
+        yield ap
+
+
+def main(argv):
+    for filename in argv[1:]:
+        wifi.print_as_tsv(iter_aps(filename))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,120 @@
+from __future__ import absolute_import, division
+
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import bssids
+import wifi
+
+# Vectorized version of the checks in wifi.AP and the filters in
+# wifi.drop_reason() for whole columns of observations, such as a
+# record.APBatch. Instead of raising on the first bad row, validate_columns()
+# returns a reason code for every row. Codes are listed in the order wifi.AP
+# and wifi.drop_reason() apply their checks, and a row gets the code of the
+# first check it fails, so the results match the scalar path row for row.
+
+OK = 0
+BAD_BSSID = 1
+BAD_LATITUDE = 2
+BAD_LONGITUDE = 3
+BAD_SSID = 4
+BAD_ACCURACY = 5
+BAD_ALTITUDE = 6
+BAD_ALTITUDE_ACCURACY = 7
+BAD_CHANNEL = 8
+BAD_SIGNAL = 9
+NULL_ISLAND = 10
+NULL_BSSID = 11
+MOBILE_SSID = 12
+
+REASONS = ('ok',
+           'bssid',
+           'latitude',
+           'longitude',
+           'ssid',
+           'accuracy',
+           'altitude',
+           'altitude_accuracy',
+           'channel',
+           'signal',
+           'null_island',
+           'null_bssid',
+           'mobile_ssid')
+
+def _between(values, low, high):
+    return (values >= low) & (values <= high)
+
+
+def _unless_zero(values, ok):
+    # wifi.AP only checks optional values that are truthy.
+    return ok | (values == 0)
+
+
+def validate_columns(timestamp, bssid, latitude, longitude,
+                     accuracy, altitude, altitude_accuracy, channel, signal,
+                     ssid_length, mobile_ssid, now=None):
+    # bssid holds 48-bit ints and missing optional values are 0. ssid_length
+    # and mobile_ssid are per-row SSID byte lengths and mobile SSID flags.
+    # Returns (timestamp, keep, reason) where timestamp has bogus values
+    # replaced by 0, like wifi.AP does.
+    if numpy is None:
+        raise ImportError('validate_columns() requires numpy')
+    if now is None:
+        now = time.time()
+
+    timestamp = numpy.asarray(timestamp)
+    timestamp = numpy.where((timestamp < wifi.MIN_TIMESTAMP) | (timestamp > now), 0, timestamp)
+
+    (latitude, longitude, bssid, accuracy, altitude, altitude_accuracy, channel, signal) = [
+        numpy.asarray(column) for column in (latitude, longitude, bssid, accuracy, altitude,
+                                             altitude_accuracy, channel, signal)]
+
+    valid_channel = numpy.zeros(channel.shape, dtype=bool)
+    for (low, high) in wifi.CHANNEL_RANGES:
+        valid_channel |= _between(channel, low, high)
+
+    failures = [
+        (BAD_BSSID, ~_between(bssid, 0, bssids.MAX_BSSID)),
+        (BAD_LATITUDE, ~_between(latitude, wifi.MIN_LATITUDE, wifi.MAX_LATITUDE)),
+        (BAD_LONGITUDE, ~_between(longitude, wifi.MIN_LONGITUDE, wifi.MAX_LONGITUDE)),
+        (BAD_SSID, numpy.asarray(ssid_length) > wifi.MAX_SSID_LENGTH),
+        (BAD_ACCURACY, ~_unless_zero(accuracy, _between(accuracy, wifi.MIN_ACCURACY, wifi.MAX_ACCURACY))),
+        (BAD_ALTITUDE, ~_unless_zero(altitude, _between(altitude, wifi.MIN_ALTITUDE, wifi.MAX_ALTITUDE))),
+        (BAD_ALTITUDE_ACCURACY, ~_unless_zero(altitude_accuracy, _between(altitude_accuracy, wifi.MIN_ACCURACY, wifi.MAX_ACCURACY))),
+        (BAD_CHANNEL, ~_unless_zero(channel, valid_channel)),
+        (BAD_SIGNAL, ~_unless_zero(signal, _between(signal, wifi.MIN_SIGNAL, wifi.MAX_SIGNAL))),
+        (NULL_ISLAND, (latitude == 0) & (longitude == 0)),
+        (NULL_BSSID, bssid == 0),
+        (MOBILE_SSID, numpy.asarray(mobile_ssid, dtype=bool)),
+    ]
+    reason = numpy.select([failed for (code, failed) in failures],
+                          [code for (code, failed) in failures],
+                          OK).astype(numpy.uint8)
+    return (timestamp, reason == OK, reason)
+
+
+def validate_batch(batch, now=None):
+    # Validates a record.APBatch. SSIDs are interned, so the SSID checks only
+    # run once per distinct SSID.
+    if numpy is None:
+        raise ImportError('validate_batch() requires numpy')
+    columns = batch.columns()
+    ssid_length = numpy.array([len(ssid) for ssid in batch.ssids], dtype=numpy.int32)
+    mobile_ssid = numpy.array([wifi._is_mobile_ssid(ssid) for ssid in batch.ssids], dtype=bool)
+    ssid = columns['ssid']
+    return validate_columns(columns['timestamp'],
+                            columns['bssid'],
+                            columns['latitude'],
+                            columns['longitude'],
+                            columns['accuracy'],
+                            columns['altitude'],
+                            columns['altitude_accuracy'],
+                            columns['channel'],
+                            columns['signal'],
+                            ssid_length[ssid],
+                            mobile_ssid[ssid],
+                            now)
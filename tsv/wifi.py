@@ -1,31 +1,54 @@
 from __future__ import absolute_import, division
 
+import contextlib
 import logging
-import re
+import os
+import sys
 import time
 
-from record import Record
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+import bssids
+import compression
+import stats as stats_module
+from record import APRecord
+from ssid_filter import SSIDFilter
+from writer import TSVWriter, format_ap
 
 NULL_BSSID = "00:00:00:00:00:00"
+_NULL_BSSID = bssids.parse(NULL_BSSID)
 
 MIN_ACCURACY, MAX_ACCURACY = 0, 20000       # radius in meters
 MIN_ALTITUDE, MAX_ALTITUDE = -418, 8848     # meters, Dead Sea, Mount Everest :)
 MIN_LATITUDE, MAX_LATITUDE = -90, +90       # degrees
 MIN_LONGITUDE, MAX_LONGITUDE = -180, +180   # degrees
 MIN_TIMESTAMP = 946684801                   # 2000-01-01 00:00:01
+MIN_SIGNAL, MAX_SIGNAL = -120, 0            # dBm
+MAX_SSID_LENGTH = 32                        # bytes
+
+# Valid Wi-Fi channel numbers, inclusive. 0 means unknown.
+CHANNEL_RANGES = [(1, 14), (36, 679), (2816, 5580), (16386, 18432)]
+
+
+# Raised by converters for input they cannot parse. reason is a short name
+# for the failure, used to count rejects in tolerant mode.
+class ParseError(ValueError):
+    def __init__(self, message, reason='parse'):
+        ValueError.__init__(self, message)
+        self.reason = reason
 
 
 def check(desc, val, ok):
     if not ok:
-        raise ValueError("%s: \"%s\"" % (desc, str(val)))
+        raise ParseError("%s: \"%s\"" % (desc, str(val)), desc)
 
 
 def check_channel(channel):
-    check("channel", channel, 1 <= channel <= 14 or
-                              36 <= channel <= 679 or
-                              2816 <= channel <= 5580 or
-                              16386 <= channel <= 18432 or
-                              channel == 0)
+    check("channel", channel, channel == 0 or
+                              any(low <= channel <= high for (low, high) in CHANNEL_RANGES))
 
 
 # https://en.wikipedia.org/wiki/Received_signal_strength_indication
@@ -43,24 +66,8 @@ def _dbm_from_rssi(rssi):
     return dbm
 
 
-_mac_colon_re = re.compile("""([0-9A-Za-z]{1,2}:){5}    # xx:xx:xx:xx:xx:
-                               [0-9A-Za-z]{1,2}         # xx """, re.X)
-
-_mac_dash_re = re.compile("""([0-9A-Za-z]{1,2}-){5}     # xx-xx-xx-xx-xx-
-                              [0-9A-Za-z]{1,2}          # xx """, re.X)
-
 def canonicalize_bssid(mac):
-    def split_mac(separator):
-        return tuple([int(xx, 16) for xx in mac.split(separator)])
-
-    if _mac_colon_re.match(mac):
-        bytes = split_mac(":")
-    elif _mac_dash_re.match(mac):
-        bytes = split_mac("-")
-    else:
-        raise ValueError("Bad BSSID: %s" % mac)
-
-    return "%02x:%02x:%02x:%02x:%02x:%02x" % bytes
+    return bssids.format(bssids.parse(mac))
 
 
 _SSID_PREFIX_LIST = [
@@ -145,21 +152,18 @@ _SSID_SUBSTRING_LIST = [
     "Mifi",
 ]
 
-def _is_mobile_ssid(ssid):
-    for prefix in _SSID_PREFIX_LIST:
-        if ssid.startswith(prefix):
-            return True
-    for suffix in _SSID_SUFFIX_LIST:
-        if ssid.endswith(suffix):
-            return True
-    for substring in _SSID_SUBSTRING_LIST:
-        if ssid.find(substring) != -1:
-            return True
-    return False
+_is_mobile_ssid = SSIDFilter(_SSID_PREFIX_LIST, _SSID_SUFFIX_LIST, _SSID_SUBSTRING_LIST)
+
+def load_ssid_rules(filename):
+    global _is_mobile_ssid
+    _is_mobile_ssid = SSIDFilter.from_rules_file(filename)
 
 assert _is_mobile_ssid("Steve's iPhone") and _is_mobile_ssid("GBUS Turbo") and not _is_mobile_ssid("not a mobile ssid")
 
 
+# Checks and fixes up one observation. Suspicious observations are not
+# dropped here but by parse_lines() and the other parse helpers, with
+# drop_reason().
 def AP(timestamp, bssid, latitude, longitude, accuracy=None, altitude=None, altitude_accuracy=None, channel=None, signal=None, ssid=""):
     #
     # Fixup measurements
@@ -170,10 +174,12 @@ def AP(timestamp, bssid, latitude, longitude, accuracy=None, altitude=None, alti
     #
     # Validate measurements
     #
-    check("bssid", bssid, bssid == canonicalize_bssid(bssid))
+    if isinstance(bssid, basestring):
+        bssid = bssids.parse(bssid)
+    check("bssid", bssid, 0 <= bssid <= bssids.MAX_BSSID)
     check("latitude", latitude, MIN_LATITUDE <= latitude <= MAX_LATITUDE)
     check("longitude", longitude, MIN_LONGITUDE <= longitude <= MAX_LONGITUDE)
-    check("ssid", ssid, 0 <= len(ssid) <= 32)
+    check("ssid", ssid, 0 <= len(ssid) <= MAX_SSID_LENGTH)
 
     if accuracy:
         check("accuracy", accuracy, MIN_ACCURACY <= accuracy <= MAX_ACCURACY)
@@ -184,26 +190,32 @@ def AP(timestamp, bssid, latitude, longitude, accuracy=None, altitude=None, alti
     if channel:
         check_channel(channel)
     if signal:
-        check("signal", signal, -120 <= signal <= 0)
-
-    #
-    # Filter out suspicious measurements
-    #
-    if ((latitude == 0 and longitude == 0) or
-        bssid == NULL_BSSID or
-        _is_mobile_ssid(ssid)):
-        return None
-
-    return Record(timestamp=timestamp,
-                  bssid=bssid,
-                  latitude=latitude,
-                  longitude=longitude,
-                  altitude=altitude,
-                  accuracy=accuracy,
-                  altitude_accuracy=altitude_accuracy,
-                  channel=channel,
-                  signal=signal,
-                  ssid=ssid)
+        check("signal", signal, MIN_SIGNAL <= signal <= MAX_SIGNAL)
+
+    return APRecord(timestamp=timestamp,
+                    bssid=bssid,
+                    latitude=latitude,
+                    longitude=longitude,
+                    accuracy=accuracy,
+                    altitude=altitude,
+                    altitude_accuracy=altitude_accuracy,
+                    channel=channel,
+                    signal=signal,
+                    ssid=ssid)
+
+
+def drop_reason(ap):
+    # Why ap is a suspicious measurement to filter out, or None. Unpacking
+    # the APRecord is faster than reading its fields by name.
+    (timestamp, bssid, latitude, longitude, accuracy, altitude, altitude_accuracy,
+     channel, signal, ssid) = ap
+    if latitude == 0 and longitude == 0:
+        return 'null_island'
+    if bssid == _NULL_BSSID:
+        return 'null_bssid'
+    if _is_mobile_ssid(ssid):
+        return 'mobile_ssid'
+    return None
 
 
 def test_re(r, group_count, tests):
@@ -219,17 +231,257 @@ def test_re(r, group_count, tests):
             assert False
 
 
+@contextlib.contextmanager
+def open_input(file):
+    # file is a filename, '-' for standard input, or an already open file
+    # object, which is not closed. Compressed files are decompressed.
+    if hasattr(file, 'read'):
+        yield file
+    else:
+        f = compression.open_input(file)
+        try:
+            yield f
+        finally:
+            f.close()
+
+
+# Exceptions that bad input can raise in a converter.
+_PARSE_ERRORS = (ValueError, ArithmeticError, AttributeError, IndexError, KeyError, TypeError)
+
+
+class ErrorRateExceeded(Exception):
+    pass
+
+
+# Rows that failed to parse in tolerant mode (see parse_lines()), and
+# rejected counts by reason.
+# Once more than max_error_rate of the rows (or of min_rows, for short
+# inputs) are rejected, reject() raises ErrorRateExceeded.
+class Rejects(object):
+    def __init__(self, max_error_rate=0.01, min_rows=1000):
+        self.max_error_rate = max_error_rate
+        self.min_rows = min_rows
+        self.rows = 0
+        self.rejected = 0
+        self.reasons = {}  # reason -> count
+        self.entries = []  # (line number, reason, error, raw row)
+        self.last_line = 0
+
+    def reject(self, number, raw, error):
+        reason = getattr(error, 'reason', type(error).__name__)
+        self.rejected += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        self.entries.append((number, reason, str(error), raw))
+        self.check_rate()
+
+    def merge(self, other):
+        # Adds other's counts, but not its entries.
+        self.rows += other.rows
+        self.rejected += other.rejected
+        for reason, count in other.reasons.iteritems():
+            self.reasons[reason] = self.reasons.get(reason, 0) + count
+
+    def check_rate(self):
+        if self.rejected > self.max_error_rate * max(self.rows, self.min_rows):
+            raise ErrorRateExceeded('%d of %d rows rejected' % (self.rejected, self.rows))
+
+
+# With stats, stage times are measured on one row in this many and scaled
+# up, so most rows cost no clock calls.
+_TIMED_ROWS = 64
+
+
+def _parse_rows(rows, parse_row, first_number, raw_row, log_errors, rejects, stats):
+    # The slow path of parse_lines(), parse_elements() and parse_rows(), for
+    # tolerant mode or when collecting stats.
+    clock = stats_module.clock
+    seconds = dict.fromkeys(('read', 'parse', 'filter'), 0.0)
+    counts = {}
+    number = first_number - 1
+    counted = number  # rows_in already added to stats
+    rows = iter(rows)
+    try:
+        while True:
+            timed = stats is not None and not number % _TIMED_ROWS
+            if timed:
+                read_start = clock()
+            row = next(rows, None)
+            if row is None:
+                break
+            number += 1
+            if rejects is not None:
+                rejects.rows += 1
+            if timed:
+                parse_start = clock()
+            try:
+                ap = parse_row(row)
+            except _PARSE_ERRORS as error:
+                if rejects is None:
+                    if log_errors:
+                        logging.error('%s: %s', error, raw_row(row))
+                    raise
+                rejects.reject(number, raw_row(row), error)
+                continue
+            if timed:
+                filter_start = clock()
+            if ap is None:
+                reason = 'skipped'
+            else:
+                reason = drop_reason(ap)
+            if timed:
+                filter_end = clock()
+                seconds['read'] += parse_start - read_start
+                seconds['parse'] += filter_start - parse_start
+                seconds['filter'] += filter_end - filter_start
+            if stats is not None and not number & 0xfff:
+                stats.count('rows_in', number - counted)
+                counted = number
+                stats.progress()
+            if reason is None:
+                counts['rows_parsed'] = counts.get('rows_parsed', 0) + 1
+                yield ap
+            else:
+                counts[reason] = counts.get(reason, 0) + 1
+    finally:
+        if rejects is not None:
+            rejects.last_line = number
+        if stats is not None:
+            stats.count('rows_in', number - counted)
+            for name, n in counts.iteritems():
+                stats.count(name, n)
+            for stage, stage_seconds in seconds.iteritems():
+                stats.seconds[stage] += stage_seconds * _TIMED_ROWS
+
+
+def parse_lines(lines, parse_line, first_line=1, rejects=None, stats=None, strip=True):
+    # The APs parse_line() returns for lines, without the ones drop_reason()
+    # filters out. first_line is the line number of the first line, after any
+    # header. With a Rejects, lines that fail to parse are skipped and
+    # recorded in it instead of raising. With a stats.Stats, rows are counted
+    # and the read, parse and filter stages timed in it. Lines are stripped of
+    # surrounding whitespace unless strip is False.
+    if rejects is not None or stats is not None:
+        if strip:
+            parse = lambda line: parse_line(line.strip())
+        else:
+            parse = parse_line
+        return _parse_rows(lines, parse, first_line,
+                           lambda line: line.rstrip('\r\n'), False, rejects, stats)
+    if strip:
+        return _parse_lines(lines, parse_line)
+    return _parse_unstripped_lines(lines, parse_line)
+
+
+def _parse_lines(lines, parse_line):
+    for line in lines:
+        ap = parse_line(line.strip())
+        if ap is not None and drop_reason(ap) is None:
+            yield ap
+
+
+def _parse_unstripped_lines(lines, parse_line):
+    for line in lines:
+        ap = parse_line(line)
+        if ap is not None and drop_reason(ap) is None:
+            yield ap
+
+
+def _element_text(element):
+    return ' '.join(ElementTree.tostring(element).split())
+
+
+def parse_elements(elements, parse_element, rejects=None, stats=None):
+    # Like parse_lines() for XML elements, which are numbered from 1.
+    if rejects is not None or stats is not None:
+        return _parse_rows(elements, parse_element, 1, _element_text, True, rejects, stats)
+    return _parse_elements(elements, parse_element)
+
+
+def _parse_elements(elements, parse_element):
+    for element in elements:
+        try:
+            ap = parse_element(element)
+        except _PARSE_ERRORS as error:
+            logging.error('%s: %s', error, _element_text(element))
+            raise
+        if ap is not None and drop_reason(ap) is None:
+            yield ap
+
+
+def _row_text(row):
+    return ','.join('"%s"' % (value,) for value in row)
+
+
+def parse_rows(rows, parse_row, rejects=None, stats=None):
+    # Like parse_lines() for database rows (tuples), which are numbered from 1.
+    if rejects is not None or stats is not None:
+        return _parse_rows(rows, parse_row, 1, _row_text, True, rejects, stats)
+    return _parse_database_rows(rows, parse_row)
+
+
+def _parse_database_rows(rows, parse_row):
+    for row in rows:
+        try:
+            ap = parse_row(row)
+        except _PARSE_ERRORS as error:
+            logging.error('%s: %s', error, _row_text(row))
+            raise
+        if ap is not None and drop_reason(ap) is None:
+            yield ap
+
+
+def split_lines(filename, chunk_size):
+    # Split filename into (start, end) byte ranges of about chunk_size bytes
+    # that begin and end on line boundaries.
+    size = os.path.getsize(filename)
+    offsets = [0]
+    with open(filename, 'rb') as file:
+        offset = chunk_size
+        while offset < size:
+            # Back up one byte so a range that already starts a line stays put.
+            file.seek(offset - 1)
+            file.readline()
+            offset = file.tell()
+            if offset >= size:
+                break
+            offsets.append(offset)
+            offset += chunk_size
+    offsets.append(size)
+    return zip(offsets[:-1], offsets[1:])
+
+
+def iter_range_lines(file, start, end):
+    # Lines of file that begin at byte offsets in [start, end).
+    file.seek(start)
+    offset = start
+    while end is None or offset < end:
+        line = file.readline()
+        if not line:
+            break
+        offset += len(line)
+        yield line
+
+
+def iterparse_elements(file, tag):
+    # Yield each complete element with the given tag, then free it and detach
+    # it from its parent, so memory use stays flat no matter how large the
+    # document is. Start events are only used to track each element's parent.
+    parents = []
+    with open_input(file) as file:
+        for event, element in ElementTree.iterparse(file, events=('start', 'end')):
+            if event == 'start':
+                parents.append(element)
+                continue
+            parents.pop()
+            if element.tag == tag:
+                yield element
+                element.clear()
+                if parents:
+                    parents[-1].remove(element)
+
+
 def print_ap(ap):
-    print "%s\t%d\t%f\t%f\t%s\t%s\t%s\t%s\t%s\t%s" % (ap.bssid,
-                                                      ap.timestamp,
-                                                      ap.latitude,
-                                                      ap.longitude,
-                                                      str(ap.accuracy) if ap.accuracy else "",
-                                                      str(ap.altitude) if ap.altitude else "",
-                                                      str(ap.altitude_accuracy) if ap.altitude_accuracy else "",
-                                                      str(ap.channel) if ap.channel else "",
-                                                      str(ap.signal) if ap.signal else "",
-                                                      ap.ssid)
+    sys.stdout.write(format_ap(ap) + "\n")
 
 """
 BSSID;LAT;LON;SSID;Crypt;Beacon Interval;Connection Mode;Channel;RXL;Date;Time
@@ -241,9 +493,8 @@ bssid	lat	lon
 MAC,SSID,AuthMode,FirstSeen,Channel,RSSI,CurrentLatitude,CurrentLongitude,AltitudeMeters,AccuracyMeters,Type
 """
 
-def print_as_tsv(file, parse_line):
-    print "# BSSID\tTimestamp\tLatitude\tLongitude\tAccuracy\tAltitude\tAltitude_Accuracy\tChannel\tSignal_dBm\tSSID"
-    for line in file:
-        ap = parse_line(line.strip())
-        if ap is not None:
-            print_ap(ap)
+def print_as_tsv(aps, stream=None):
+    with TSVWriter(stream or sys.stdout) as writer:
+        for ap in aps:
+            writer.write(ap)
+    return writer
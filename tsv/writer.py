@@ -0,0 +1,108 @@
+from __future__ import absolute_import, division
+
+import bssids
+
+HEADER = "# BSSID\tTimestamp\tLatitude\tLongitude\tAccuracy\tAltitude\tAltitude_Accuracy\tChannel\tSignal_dBm\tSSID"
+
+_ROW_FORMAT = "%s\t%d\t%f\t%f\t%s\t%s\t%s\t%s\t%s\t%s"
+
+# Rows of record.APSummary, written by stumbler_tsv.py --aggregate: the .tsv
+# columns with the first timestamp and the observation count before the SSID,
+# which stays last.
+SUMMARY_HEADER = "# BSSID\tTimestamp\tLatitude\tLongitude\tAccuracy\tAltitude\tAltitude_Accuracy\tChannel\tSignal_dBm\tFirst_Timestamp\tCount\tSSID"
+
+_SUMMARY_ROW_FORMAT = "%s\t%d\t%f\t%f\t%s\t%s\t%s\t%s\t%s\t%d\t%d\t%s"
+
+
+def format_ap(ap):
+    return _ROW_FORMAT % (bssids.format(ap.bssid),
+                          ap.timestamp,
+                          ap.latitude,
+                          ap.longitude,
+                          str(ap.accuracy) if ap.accuracy else "",
+                          str(ap.altitude) if ap.altitude else "",
+                          str(ap.altitude_accuracy) if ap.altitude_accuracy else "",
+                          str(ap.channel) if ap.channel else "",
+                          str(ap.signal) if ap.signal else "",
+                          ap.ssid)
+
+
+def format_summary(ap):
+    return _SUMMARY_ROW_FORMAT % (bssids.format(ap.bssid),
+                                  ap.timestamp,
+                                  ap.latitude,
+                                  ap.longitude,
+                                  str(ap.accuracy) if ap.accuracy else "",
+                                  str(ap.altitude) if ap.altitude else "",
+                                  str(ap.altitude_accuracy) if ap.altitude_accuracy else "",
+                                  str(ap.channel) if ap.channel else "",
+                                  str(ap.signal) if ap.signal else "",
+                                  ap.first_timestamp,
+                                  ap.count,
+                                  ap.ssid)
+
+
+def format_aps(aps, format=format_ap):
+    # One string holding a newline-terminated row for each AP.
+    rows = [format(ap) for ap in aps]
+    if not rows:
+        return ""
+    rows.append("")
+    return "\n".join(rows)
+
+
+# Buffers formatted rows and writes them to stream in flush_size chunks, so a
+# conversion makes a few large writes instead of one print per AP. stream can
+# be any file-like object with a write() method, text or binary. With summary,
+# it writes APSummary rows in the summary format.
+class TSVWriter(object):
+    def __init__(self, stream, flush_size=1 << 20, header=True, summary=False):
+        self._stream = stream
+        self._format = format_summary if summary else format_ap
+        self._flush_size = flush_size
+        self._buffer = []
+        self._buffered = 0
+        self.bytes_written = 0
+        self.rows_written = 0
+        if header:
+            self._append((SUMMARY_HEADER if summary else HEADER) + "\n", 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.flush()
+
+    def _append(self, chunk, rows):
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        self.rows_written += rows
+        if self._buffered >= self._flush_size:
+            self.flush()
+
+    def write(self, ap):
+        self._append(self._format(ap) + "\n", 1)
+
+    def write_batch(self, aps):
+        rows = [self._format(ap) for ap in aps]
+        if rows:
+            rows.append("")
+            self._append("\n".join(rows), len(rows) - 1)
+
+    def write_formatted(self, chunk, rows):
+        # chunk is rows already formatted by format_aps().
+        if chunk:
+            self._append(chunk, rows)
+
+    def flush(self):
+        if self._buffer:
+            data = "".join(self._buffer)
+            self._stream.write(data)
+            self.bytes_written += len(data)
+            self._buffer = []
+            self._buffered = 0
+        if hasattr(self._stream, 'flush'):
+            self._stream.flush()
+
+    def close(self):
+        self.flush()